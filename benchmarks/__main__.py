@@ -0,0 +1,127 @@
+"""
+Run the benchmark scenarios and print one JSON object per scenario.
+
+    python -m benchmarks --rows 100000 --output results.jsonl
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+from datanorm_writer.writer import DatanormWriter
+
+from .catalog import CatalogGenerator
+from .scenarios import SCENARIOS
+
+HEADER = {
+    "erstellungsdatum": date(2020, 1, 1),
+    "informationstext1": " " * 40,
+    "informationstext2": " " * 40,
+    "informationstext3": " " * 35,
+}
+
+
+class NullStream(object):
+    """A binary sink that only counts bytes."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def export(products, row_class, scenario):
+    stream = NullStream()
+    with DatanormWriter(stream, HEADER, row_class) as writer:
+        writer.write_rows(scenario(products))
+    return writer.rows_written, stream.size
+
+
+def git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode("ascii")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(name, products, memory=True):
+    row_class, scenario = SCENARIOS[name]
+
+    start = time.perf_counter()
+    rows, size = export(products, row_class, scenario)
+    seconds = time.perf_counter() - start
+
+    result = {
+        "scenario": name,
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1),
+        "mb_per_sec": round(size / seconds / 1e6, 3),
+    }
+
+    if memory:
+        # a separate run, tracemalloc slows down allocations considerably
+        tracemalloc.start()
+        export(products, row_class, scenario)
+        result["peak_tracemalloc"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # kilobytes on linux
+    result["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--umlaut-ratio", type=float, default=0.1)
+    parser.add_argument("--text-length", type=int, default=300)
+    parser.add_argument("--tiers", type=int, default=3)
+    parser.add_argument(
+        "--scenario", action="append", choices=sorted(SCENARIOS), dest="scenarios"
+    )
+    parser.add_argument("--no-memory", action="store_false", dest="memory")
+    parser.add_argument("--output", type=argparse.FileType("a"), default=sys.stdout)
+    args = parser.parse_args(argv)
+
+    generator = CatalogGenerator(
+        seed=args.seed,
+        umlaut_ratio=args.umlaut_ratio,
+        text_length=args.text_length,
+        tiers=args.tiers,
+    )
+    products = list(generator.products(args.rows))
+    context = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "products": args.rows,
+        "seed": args.seed,
+        "umlaut_ratio": args.umlaut_ratio,
+        "text_length": args.text_length,
+        "tiers": args.tiers,
+    }
+
+    for name in args.scenarios or sorted(SCENARIOS):
+        result = dict(context, **run(name, products, args.memory))
+        args.output.write(json.dumps(result, sort_keys=True) + "\n")
+        args.output.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Deterministic synthetic catalogs for benchmarks.
+"""
+
+import random
+
+WORDS = (
+    "Kabel",
+    "Rohr",
+    "Schelle",
+    "Muffe",
+    "Winkel",
+    "Messing",
+    "Kupfer",
+    "verzinkt",
+    "Edelstahl",
+    "Dichtung",
+    "Anschluss",
+    "Gewinde",
+    "Flansch",
+    "Ventil",
+    "Schraube",
+)
+UMLAUT_WORDS = (
+    "Größe",
+    "Länge",
+    "Außengewinde",
+    "Übergang",
+    "Stück",
+    "Kühlung",
+    "Öffnung",
+)
+UNITS = ("STK", "PCE", "M", "KG", "PAK")
+
+
+class CatalogGenerator(object):
+    """
+    Generate product mappings with a fixed seed, so every run and every
+    commit sees the same catalog.
+
+    :param umlaut_ratio: Share of words taken from the umlaut word list.
+    :param text_length: Approximate length of the long text per product.
+    :param tiers: Number of scaled price tiers per product.
+    """
+
+    def __init__(self, seed=0, umlaut_ratio=0.1, text_length=300, tiers=3):
+        self.seed = seed
+        self.umlaut_ratio = umlaut_ratio
+        self.text_length = text_length
+        self.tiers = tiers
+
+    def words(self, rnd, length):
+        words = []
+        size = 0
+        while size < length:
+            if rnd.random() < self.umlaut_ratio:
+                word = rnd.choice(UMLAUT_WORDS)
+            else:
+                word = rnd.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        return " ".join(words)[:length].strip()
+
+    def products(self, count):
+        rnd = random.Random(self.seed)
+        for i in range(count):
+            price = rnd.randint(10, 500000)
+            yield {
+                "artikelnummer": "%d" % (1000000 + i),
+                "kurztext_1": self.words(rnd, rnd.randint(10, 40)),
+                "kurztext_2": self.words(rnd, rnd.randint(0, 40)),
+                "mengeneinheit": rnd.choice(UNITS),
+                "preis": price,
+                "rabattgruppe": "R%d" % rnd.randint(1, 9),
+                "hauptwarengruppe": "%d" % rnd.randint(100, 120),
+                "warengruppe": "W%d" % rnd.randint(1, 50),
+                "ean": "%013d" % rnd.randint(0, 10**13 - 1),
+                "verpackungsmenge": rnd.choice((1, 1, 1, 5, 10, 100)),
+                "langtext": self.words(rnd, self.text_length),
+                "staffelpreise": [
+                    (10**tier, price - price * tier // 20) for tier in range(self.tiers)
+                ],
+            }
@@ -0,0 +1,82 @@
+"""
+Compare the single pass long text wrapper with the chunk_text that sliced
+off the rest of the line for every chunk, on 10k character texts.
+
+    python -m benchmarks.chunk_text [texts] [text_length]
+"""
+
+import sys
+import time
+from unicodedata import normalize
+
+from datanorm_writer.base import chunk_text, chunk_texts, wrap_text
+
+from .catalog import CatalogGenerator
+
+LINE_LENGTH = 40
+
+
+def legacy_chunk_text(text, chunk_size, split_char=" "):
+    text = normalize("NFKC", text)
+
+    lines = text.splitlines()
+    chunks = []
+    for line in lines:
+        while True:
+            line = line.strip()
+            if len(line) > chunk_size:
+                separate_at = line[:chunk_size].rfind(split_char)
+                if separate_at == -1:
+                    separate_at = chunk_size
+                chunk, line = line[:separate_at], line[separate_at:]
+                chunks.append(chunk)
+            else:
+                chunks.append(line)
+                break
+    return chunks
+
+
+def measure(wrap, texts):
+    start = time.perf_counter()
+    result = wrap(texts)
+    return result, len(texts) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if len(argv) > 0 else 1000
+    text_length = int(argv[1]) if len(argv) > 1 else 10000
+
+    generator = CatalogGenerator(text_length=text_length)
+    texts = [product["langtext"] for product in generator.products(count)]
+    # catalogs repeat long texts for product variants
+    repeated = texts[: count // 4] * 4
+
+    expected, before = measure(
+        lambda texts: [legacy_chunk_text(text, LINE_LENGTH) for text in texts], texts
+    )
+    result, after = measure(
+        lambda texts: [chunk_text(text, LINE_LENGTH) for text in texts], texts
+    )
+    assert result == expected
+
+    wrap_text.cache_clear()
+    _, legacy_repeated = measure(
+        lambda texts: [legacy_chunk_text(text, LINE_LENGTH) for text in texts], repeated
+    )
+    result, batched = measure(lambda texts: chunk_texts(texts, LINE_LENGTH), repeated)
+    assert list(map(list, result)) == expected[: count // 4] * 4
+
+    print("%d texts of %d characters" % (count, text_length))
+    print("legacy chunk_text:  %10.0f texts/sec" % before)
+    print("single pass:        %10.0f texts/sec (%.2fx)" % (after, after / before))
+    print("each text 4 times")
+    print("legacy chunk_text:  %10.0f texts/sec" % legacy_repeated)
+    print(
+        "chunk_texts:        %10.0f texts/sec (%.2fx)"
+        % (batched, batched / legacy_repeated)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare encoding Artikelzeile rows from columns with building one row
+object per product.
+
+    python -m benchmarks.columnar [rows]
+"""
+
+import sys
+import time
+
+from datanorm_writer.rows import Artikelzeile
+
+
+def make_columns(count):
+    return {
+        "verarbeitungsmerker": ["N"] * count,
+        "artikelnummer": ["%d" % (100000 + i) for i in range(count)],
+        "textkennzeichen": ["00"] * count,
+        "kurztext_1": [
+            "Kabelverschraubung M%d Messing" % (i % 50) for i in range(count)
+        ],
+        "kurztext_2": ["Größe %d" % (i % 7) for i in range(count)],
+        "preiskennzeichen": [Artikelzeile.PREIS_LISTENPREIS] * count,
+        "preiseinheit": [Artikelzeile.PRICE_BY_1_UNIT] * count,
+        "mengeneinheit": ["STK"] * count,
+        "preis": [i % 100000 for i in range(count)],
+        "rabattgruppe": ["R1"] * count,
+        "hauptwarengruppe": ["100"] * count,
+        "langtextnummer": [" "] * count,
+    }
+
+
+def per_row(columns):
+    names = list(columns)
+    return [
+        Artikelzeile(**dict(zip(names, values))).output
+        for values in zip(*columns.values())
+    ]
+
+
+def columnar(columns):
+    return list(Artikelzeile.encode_columns(columns))
+
+
+def measure(encode, columns, count):
+    start = time.perf_counter()
+    result = encode(columns)
+    return result, count / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 1000000
+    columns = make_columns(count)
+
+    expected, before = measure(per_row, columns, count)
+    result, after = measure(columnar, columns, count)
+    assert result == expected
+
+    print("Artikelzeile, %d rows" % count)
+    print("row objects:  %10.0f rows/sec" % before)
+    print("columns:      %10.0f rows/sec (%.2fx)" % (after, after / before))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Compare two result files written by python -m benchmarks.
+
+    python -m benchmarks.compare before.jsonl after.jsonl
+"""
+
+import json
+import sys
+
+METRICS = ("rows_per_sec", "mb_per_sec", "peak_tracemalloc")
+
+
+def load(path):
+    with open(path) as f:
+        return dict(
+            (result["scenario"], result) for result in map(json.loads, f) if result
+        )
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    before, after = load(argv[0]), load(argv[1])
+    for scenario in sorted(set(before) & set(after)):
+        for metric in METRICS:
+            old, new = before[scenario].get(metric), after[scenario].get(metric)
+            if old and new is not None:
+                print(
+                    "%-18s %-17s %14s %14s %+7.1f%%"
+                    % (scenario, metric, old, new, 100.0 * (new - old) / old)
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure how parallel export scales with the number of worker processes
+and threads. Threads only scale on free-threaded builds like 3.13t.
+
+    python -m benchmarks.parallel [rows] [workers ...]
+"""
+
+import io
+import os
+import sys
+import time
+from datetime import date
+
+from datanorm_writer.rows import Artikelzeile
+from datanorm_writer.writer import DatanormWriter
+
+HEADER = {
+    "erstellungsdatum": date(2020, 1, 1),
+    "informationstext1": " " * 40,
+    "informationstext2": " " * 40,
+    "informationstext3": " " * 35,
+}
+
+
+def make_rows(count):
+    for i in range(count):
+        yield {
+            "verarbeitungsmerker": "N",
+            "artikelnummer": "%d" % (100000 + i),
+            "textkennzeichen": "00",
+            "kurztext_1": "Kabelverschraubung M%d Messing" % (i % 50),
+            "kurztext_2": "Größe %d" % (i % 7),
+            "preiskennzeichen": Artikelzeile.PREIS_LISTENPREIS,
+            "preiseinheit": Artikelzeile.PRICE_BY_1_UNIT,
+            "mengeneinheit": "STK",
+            "preis": i % 100000,
+        }
+
+
+def gil_enabled():
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+def export(count, workers, threads=False):
+    stream = io.BytesIO()
+    with DatanormWriter(stream, HEADER, Artikelzeile) as writer:
+        if workers:
+            writer.write_rows_parallel(
+                make_rows(count), max_workers=workers, chunk_size=5000, threads=threads
+            )
+        else:
+            writer.write_rows(make_rows(count))
+    return stream.getvalue()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 2000000
+    workers = [int(x) for x in argv[1:]] or sorted({1, 2, 4, os.cpu_count() or 1})
+
+    start = time.perf_counter()
+    expected = export(count, 0)
+    baseline = count / (time.perf_counter() - start)
+    print(
+        "%d rows, %d cores, GIL %s"
+        % (count, os.cpu_count() or 1, "enabled" if gil_enabled() else "disabled")
+    )
+    print("sequential:  %10.0f rows/sec" % baseline)
+
+    for threads in (False, True):
+        for worker_count in workers:
+            start = time.perf_counter()
+            assert export(count, worker_count, threads) == expected
+            rate = count / (time.perf_counter() - start)
+            print(
+                "%2d %s: %10.0f rows/sec (%.2fx)"
+                % (
+                    worker_count,
+                    "threads  " if threads else "processes",
+                    rate,
+                    rate / baseline,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the compiled row encoder with the generic per-field loop and
+character by character encoding that RowBase.output used before, with
+value caches and in trusted mode.
+
+    python -m benchmarks.row_encoding [rows]
+"""
+
+import logging
+import sys
+import time
+from unicodedata import normalize
+
+from datanorm_writer.rows import Artikelzeile
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_normalize_and_encode(charset, value, field_name=None) -> bytes:
+    value = normalize("NFKC", value)
+
+    invalid = set(value) - set(charset.keys())
+
+    if invalid:
+        error = "Invalid characters %s in string" % ", ".join(invalid)
+        if field_name:
+            error += " translating field {}".format(field_name)
+        logger.error(error)
+
+    return b"".join(charset.get(x, b"") for x in value)
+
+
+def legacy_output(row) -> bytes:
+    return (
+        row.separator.join(
+            legacy_normalize_and_encode(
+                row.charset, field.process(row.values[field_name]), field_name
+            )
+            for (field_name, field) in list(row.fields.items())
+        )
+        + row.separator
+    )
+
+
+class CachedArtikelzeile(Artikelzeile):
+    cache_size = 1024
+
+
+def make_rows(count, row_class=Artikelzeile):
+    return [
+        row_class(
+            verarbeitungsmerker="N",
+            artikelnummer="%d" % (100000 + i),
+            textkennzeichen="00",
+            kurztext_1="Kabelverschraubung M%d Messing" % (i % 50),
+            kurztext_2="Größe %d" % (i % 7),
+            preiskennzeichen=Artikelzeile.PREIS_LISTENPREIS,
+            preiseinheit=Artikelzeile.PRICE_BY_1_UNIT,
+            mengeneinheit="STK",
+            preis=i % 100000,
+            rabattgruppe="R1",
+            hauptwarengruppe="100",
+            langtextnummer=" ",
+        )
+        for i in range(count)
+    ]
+
+
+def measure(encode, rows):
+    start = time.perf_counter()
+    for row in rows:
+        encode(row)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 100000
+    rows = make_rows(count)
+    assert all(legacy_output(row) == row.output for row in rows[:1000])
+
+    before = measure(legacy_output, rows)
+    after = measure(lambda row: row.output, rows)
+    cached_rows = make_rows(count, CachedArtikelzeile)
+    cached = measure(lambda row: row.output, cached_rows)
+    assert [row.output for row in rows[:1000]] == [
+        row.output for row in cached_rows[:1000]
+    ]
+    trusted = measure(lambda row: row.encode(row.values, "trusted"), rows)
+    assert all(row.encode(row.values, "trusted") == row.output for row in rows[:1000])
+
+    print("Artikelzeile, %d rows" % count)
+    print("generic loop:     %10.0f rows/sec" % before)
+    print("compiled encoder: %10.0f rows/sec (%.2fx)" % (after, after / before))
+    print("value caches:     %10.0f rows/sec (%.2fx)" % (cached, cached / before))
+    print("trusted:          %10.0f rows/sec (%.2fx)" % (trusted, trusted / before))
+
+
+if __name__ == "__main__":
+    main()
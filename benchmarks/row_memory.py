@@ -0,0 +1,66 @@
+"""
+Compare the memory used per buffered row for row instances, which keep
+a values dict and an instance __dict__, compact records and plain value
+tuples.
+
+    python -m benchmarks.row_memory [rows]
+"""
+
+import sys
+import tracemalloc
+
+from datanorm_writer.rows import Artikelzeile2
+
+
+def make_values(count):
+    return [
+        {
+            "verarbeitungsmerker": "N",
+            "artikelnummer": "%d" % (100000 + i),
+            "ean": "%013d" % i,
+            "warengruppe": "W%d" % (i % 50),
+            "verpackungsmenge": 1,
+        }
+        for i in range(count)
+    ]
+
+
+def measure(build, values):
+    tracemalloc.start()
+    rows = build(values)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return rows, size / len(values)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 100000
+    values = make_values(count)
+    fields = list(Artikelzeile2.base_fields)
+
+    instances, instance_size = measure(
+        lambda values: [Artikelzeile2(**row) for row in values], values
+    )
+    records, record_size = measure(
+        lambda values: [Artikelzeile2.Record(**row) for row in values], values
+    )
+    tuples, tuple_size = measure(
+        lambda values: [tuple([row.get(name) for name in fields]) for row in values],
+        values,
+    )
+    assert [row.output for row in instances[:100]] == [
+        record.output for record in records[:100]
+    ]
+    assert [record.output for record in records[:100]] == [
+        Artikelzeile2.encode_tuple(row) for row in tuples[:100]
+    ]
+
+    print("Artikelzeile2, %d buffered rows, bytes per row" % count)
+    print("Artikelzeile2 rows:    %6.0f" % instance_size)
+    print("Artikelzeile2.Record:  %6.0f" % record_size)
+    print("plain tuples:          %6.0f" % tuple_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark scenarios, each turning catalog products into row value mappings
+for one row class.
+"""
+
+from datanorm_writer.base import chunk_text
+from datanorm_writer.rows import (
+    Artikelzeile,
+    Artikelzeile2,
+    Langtextzeile,
+    Staffelpreiszeile,
+)
+
+
+def artikel(products):
+    for product in products:
+        yield {
+            "verarbeitungsmerker": "N",
+            "artikelnummer": product["artikelnummer"],
+            "textkennzeichen": Artikelzeile.TEXT_KURZ1_KURZ2_LANG
+            + Artikelzeile.TEXT_HAS_KURZ2_TRUE,
+            "kurztext_1": product["kurztext_1"],
+            "kurztext_2": product["kurztext_2"],
+            "preiskennzeichen": Artikelzeile.PREIS_LISTENPREIS,
+            "preiseinheit": Artikelzeile.PRICE_BY_1_UNIT,
+            "mengeneinheit": product["mengeneinheit"],
+            "preis": product["preis"],
+            "rabattgruppe": product["rabattgruppe"],
+            "hauptwarengruppe": product["hauptwarengruppe"],
+            "langtextnummer": product["artikelnummer"],
+        }
+
+
+def artikel2(products):
+    for product in products:
+        yield {
+            "verarbeitungsmerker": "N",
+            "artikelnummer": product["artikelnummer"],
+            "ean": product["ean"],
+            "warengruppe": product["warengruppe"],
+            "verpackungsmenge": product["verpackungsmenge"],
+        }
+
+
+def langtext(products):
+    for product in products:
+        lines = chunk_text(product["langtext"], 40)
+        for index in range(0, len(lines), 2):
+            pair = lines[index : index + 2]
+            yield {
+                "verarbeitungsmerker": "N",
+                "langtextnummer": product["artikelnummer"][-8:],
+                "zeilennummer_1": index + 1,
+                "langtextzeile_1": pair[0],
+                "zeilennummer_2": index + 2 if len(pair) > 1 else None,
+                "langtextzeile_2": pair[1] if len(pair) > 1 else None,
+            }
+
+
+def staffelpreis(products):
+    for product in products:
+        tiers = product["staffelpreise"]
+        for index, (quantity, price) in enumerate(tiers):
+            yield {
+                "verarbeitungsmerker": "N",
+                "artikelnummer": product["artikelnummer"],
+                "satznummer": index + 1,
+                "basismerker": Staffelpreiszeile.ORDER_QUANTITY,
+                "preiskennzeichen": Staffelpreiszeile.LIST_PRICE,
+                "preis": price,
+                "von_basis": quantity,
+                "bis_basis": (
+                    tiers[index + 1][0] - 1 if index + 1 < len(tiers) else None
+                ),
+            }
+
+
+SCENARIOS = {
+    "artikelzeile": (Artikelzeile, artikel),
+    "artikelzeile2": (Artikelzeile2, artikel2),
+    "langtextzeile": (Langtextzeile, langtext),
+    "staffelpreiszeile": (Staffelpreiszeile, staffelpreis),
+}
@@ -0,0 +1,77 @@
+"""
+Compare building Staffelpreiszeile records from a tier table with the
+streaming bulk builder against one row object per tier, with Decimal
+prices.
+
+    python -m benchmarks.staffelpreis [articles]
+"""
+
+import sys
+import time
+from decimal import Decimal
+
+from datanorm_writer.composer import ProductComposer, to_cents
+from datanorm_writer.rows import Staffelpreiszeile
+
+from .catalog import CatalogGenerator
+
+
+def make_tiers(count):
+    generator = CatalogGenerator(text_length=0)
+    return [
+        (product["artikelnummer"], quantity, Decimal(price) / 100)
+        for product in generator.products(count)
+        for quantity, price in product["staffelpreise"]
+    ]
+
+
+def per_row(tiers):
+    records = []
+    satznummer = 0
+    for index, (artikelnummer, quantity, price) in enumerate(tiers):
+        if index and tiers[index - 1][0] == artikelnummer:
+            satznummer += 1
+        else:
+            satznummer = 1
+        has_next = index + 1 < len(tiers) and tiers[index + 1][0] == artikelnummer
+        records.append(
+            Staffelpreiszeile(
+                verarbeitungsmerker="N",
+                artikelnummer=artikelnummer,
+                satznummer=satznummer,
+                basismerker=Staffelpreiszeile.ORDER_QUANTITY,
+                preiskennzeichen=Staffelpreiszeile.LIST_PRICE,
+                preis=to_cents(price),
+                von_basis=quantity,
+                bis_basis=tiers[index + 1][1] - 1 if has_next else None,
+            ).output
+        )
+    return records
+
+
+def bulk(tiers):
+    return list(ProductComposer().staffelpreis_batch(tiers))
+
+
+def measure(build, tiers):
+    start = time.perf_counter()
+    result = build(tiers)
+    return result, len(tiers) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 100000
+    tiers = make_tiers(count)
+
+    expected, before = measure(per_row, tiers)
+    result, after = measure(bulk, tiers)
+    assert result == expected
+
+    print("Staffelpreiszeile, %d articles, %d tiers" % (count, len(tiers)))
+    print("row objects:  %10.0f tiers/sec" % before)
+    print("bulk builder: %10.0f tiers/sec (%.2fx)" % (after, after / before))
+
+
+if __name__ == "__main__":
+    main()
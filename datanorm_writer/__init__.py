@@ -0,0 +1,7 @@
+def __getattr__(name):
+    # imported lazily, so that the command line interface starts quickly
+    if name == "DatanormWriter":
+        from .writer import DatanormWriter
+
+        return DatanormWriter
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,181 @@
+import asyncio
+import functools
+import inspect
+import logging
+
+from .diagnostics import Diagnostics
+from .parallel import encode_chunk, result
+from .rows import VorlaufZeile
+from .writer import collects_errors, encode_row
+
+logger = logging.getLogger(__name__)
+
+
+async def iterate(rows):
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+class AsyncDatanormWriter(object):
+    """
+    Write datanorm records to an async byte sink from asyncio code.
+
+    Rows are read from an async iterable in batches, every batch is encoded
+    on an executor (the loop's default executor unless one is given) so the
+    event loop is never blocked by encoding. Encoded batches wait in a queue
+    of max_pending entries for the sink, which makes reading rows, encoding
+    and writing overlap while slow sinks apply backpressure.
+
+    :param sink: An object with a write method that is a coroutine function,
+        or returns None like asyncio.StreamWriter, in which case drain is
+        awaited after writing.
+    :param header: A VorlaufZeile or a mapping of its values.
+    :param row_class: The RowBase subclass used for rows given as mappings.
+    :param diagnostics: A Diagnostics collector for invalid characters, see
+        DatanormWriter.
+    :param validation: The validation mode, see DatanormWriter.
+    """
+
+    line_separator = b"\r\n"
+    header_class = VorlaufZeile
+
+    def __init__(
+        self,
+        sink,
+        header=None,
+        row_class=None,
+        batch_size=1000,
+        executor=None,
+        max_pending=4,
+        diagnostics=None,
+        validation=None,
+    ):
+        self.sink = sink
+        self.header = header
+        self.row_class = row_class
+        self.batch_size = batch_size
+        self.executor = executor
+        self.max_pending = max_pending
+        self.diagnostics = Diagnostics() if diagnostics is None else diagnostics
+        self.validation = validation
+        self.errors = []
+
+        self.rows_written = 0
+        self.bytes_written = 0
+
+        self._rows_read = 0
+        self._header_written = False
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.close()
+
+    @property
+    def stats(self):
+        return {"rows": self.rows_written, "bytes": self.bytes_written}
+
+    async def write_header(self, header=None):
+        if self._header_written:
+            raise ValueError("Header has already been written")
+
+        header = self.header if header is None else header
+        if header is None:
+            raise ValueError("No header to write")
+
+        self._header_written = True
+        with self.diagnostics.activate():
+            record = encode_row(header, self.header_class)
+        # headers are not counted in rows_written
+        await self._write(record + self.line_separator)
+
+    async def write_rows(self, rows, row_class=None):
+        """
+        Encode and write rows from an async iterable (or a plain iterable) of
+        RowBase instances or mappings of values.
+        """
+        if self._closed:
+            raise ValueError("Writer is closed")
+        if not self._header_written:
+            await self.write_header()
+
+        row_class = row_class or self.row_class
+        encode = functools.partial(
+            encode_row, row_class=row_class, validation=self.validation
+        )
+        errors = self.errors if collects_errors(self.validation, row_class) else None
+        queue = asyncio.Queue(self.max_pending)
+        producer = asyncio.ensure_future(self._produce(rows, encode, queue, errors))
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                future, count = item
+                await future
+                data, count = result(future, count, self.diagnostics, errors)
+                await self._write(data)
+                self.rows_written += count
+        finally:
+            if not producer.done():
+                producer.cancel()
+        await producer
+
+    async def close(self):
+        if self._closed:
+            return self.stats
+        if not self._header_written and self.header is not None:
+            await self.write_header()
+        self._closed = True
+
+        logger.info(
+            "Wrote %d datanorm rows, %d bytes", self.rows_written, self.bytes_written
+        )
+        self.diagnostics.log_summary()
+        return self.stats
+
+    async def _produce(self, rows, encode, queue, errors=None):
+        loop = asyncio.get_running_loop()
+
+        async def submit(batch):
+            future = loop.run_in_executor(
+                self.executor,
+                encode_chunk,
+                encode,
+                self._rows_read,
+                batch,
+                self.line_separator,
+                True,
+                errors is not None,
+            )
+            self._rows_read += len(batch)
+            await queue.put((future, len(batch)))
+
+        try:
+            batch = []
+            async for row in iterate(rows):
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    await submit(batch)
+                    batch = []
+            if batch:
+                await submit(batch)
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _write(self, data):
+        result = self.sink.write(data)
+        if inspect.isawaitable(result):
+            await result
+        elif hasattr(self.sink, "drain"):
+            await self.sink.drain()
+        self.bytes_written += len(data)
@@ -1,13 +1,62 @@
+import functools
 import logging
-from collections import OrderedDict
-from typing import Mapping
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from typing import Iterator, Mapping
 from unicodedata import normalize
 
+from .codec import InvalidCharacters, get_codec, register_charset
+from .diagnostics import report_invalid
+
 logger = logging.getLogger(__name__)
 
 
+class RowError(ValueError):
+    """
+    A validation error for a field of a specific input row.
+    """
+
+    def __init__(self, index, field_name, message):
+        super(RowError, self).__init__(index, field_name, message)
+        self.index = index
+        self.field_name = field_name
+        self.message = message
+
+    def __str__(self):
+        return "row {}, field {}: {}".format(self.index, self.field_name, self.message)
+
+    @classmethod
+    def from_error(cls, index, field_name, error):
+        # field errors are raised as ValueError(field_name, message)
+        if field_name is None and len(error.args) > 1:
+            field_name = error.args[0]
+        message = error.args[-1] if error.args else str(error)
+        return cls(index, field_name, str(message))
+
+
+def column_values(column) -> list:
+    """
+    Convert a column (list, tuple, numpy or arrow array) into a list of
+    python values.
+    """
+    if isinstance(column, list):
+        return column
+    if hasattr(column, "to_pylist"):
+        return column.to_pylist()
+    if hasattr(column, "tolist"):
+        return column.tolist()
+    return list(column)
+
+
 class FieldBase(object):
+    """
+    Fields are shared by all rows of a row class and hold no per value
+    state, so rows can be encoded from several threads at once.
+    """
+
     creation_counter = 0
+    _creation_lock = threading.Lock()
 
     def __init__(
         self,
@@ -17,12 +66,14 @@ class FieldBase(object):
         index=None,
         blank=False,
         required=False,
+        cache_size=None,
     ):
         if length and max_length and length != max_length:
             raise ValueError("max_length != length")
 
-        self.creation_counter = FieldBase.creation_counter
-        FieldBase.creation_counter += 1
+        with FieldBase._creation_lock:
+            self.creation_counter = FieldBase.creation_counter
+            FieldBase.creation_counter += 1
 
         self.length = length
         self.max_length = max_length
@@ -30,16 +81,8 @@ class FieldBase(object):
         self.required = required
         self.index = index
         self.blank = blank
+        self.cache_size = cache_size
         self.field_name = None
-        self._value = None
-
-    @property
-    def value(self):
-        return self._value
-
-    @value.setter
-    def value(self, value):
-        self._value = self.process(value)
 
     @property
     def feldnummer(self):
@@ -51,6 +94,52 @@ class FieldBase(object):
     def process(self, value=None) -> str:
         raise NotImplementedError("Define in concrete field types")
 
+    def format(self, value=None) -> str:
+        """
+        Convert a value into text like process, without validating it. Used
+        for trusted input, see RowBase.validation.
+        """
+        return self.process(value)
+
+    def parse(self, text: str):
+        """
+        Convert the text of a field read from a datanorm file into a value.
+        """
+        return text
+
+    def process_column(self, values: list) -> list:
+        """
+        Process a whole column of values, raising a RowError with the index of
+        the first invalid value.
+        """
+        process = self.process
+        processed = []
+        for index, value in enumerate(values):
+            try:
+                processed.append(process(value))
+            except ValueError as e:
+                raise RowError.from_error(index, self.field_name, e) from e
+        return processed
+
+
+def compile_values(values):
+    """
+    Turn the allowed values of a field, any iterable including generators
+    and strings of single characters, into a frozenset, or None when every
+    value is allowed.
+    """
+    if values is None:
+        return None
+    return frozenset(values) or None
+
+
+def is_allowed(value, values: frozenset) -> bool:
+    try:
+        return value in values
+    except TypeError:
+        # unhashable values are never allowed
+        return False
+
 
 def get_declared_fields(bases, attrs):
     """
@@ -64,16 +153,23 @@ def get_declared_fields(bases, attrs):
         if isinstance(obj, FieldBase)
     ]
     fields = sorted(fields, key=lambda x: x[1].creation_counter)
-    for index, (field_name, field) in enumerate(fields):
+
+    # inherited fields come first, redeclared fields keep their position
+    all_fields = OrderedDict()
+    for base in reversed(bases):
+        all_fields.update(getattr(base, "base_fields", {}))
+    all_fields.update(fields)
+    positions = dict((field_name, index) for index, field_name in enumerate(all_fields))
+
+    for field_name, field in fields:
         assert isinstance(field_name, str)
         assert isinstance(field, FieldBase)
         if field.name is None:
             field.name = field_name.replace("_", " ").capitalize()
-            field.index = index
+            field.index = positions[field_name]
         field.field_name = field_name
 
-    fields.sort(key=lambda x: x[1].creation_counter)
-    return OrderedDict(fields)
+    return all_fields
 
 
 valid_ascii_characters = (
@@ -98,6 +194,59 @@ charset_translations = dict((x, x.encode("ascii")) for x in valid_ascii_characte
 charset_translations.update(custom_characters)
 
 
+# replacements for common characters missing from the datanorm charset,
+# applied after NFKC normalization, see RowBase.transliterations
+transliterations = {
+    "€": "EUR",
+    "°": " Grad",
+    "Ø": "O",
+    "ø": "o",
+    "Æ": "AE",
+    "æ": "ae",
+    "Œ": "OE",
+    "œ": "oe",
+    "ç": "c",
+    "Ç": "C",
+    "ñ": "n",
+    "Ñ": "N",
+    "–": "-",
+    "—": "-",
+    "‘": "'",
+    "’": "'",
+    "‚": "'",
+    "‹": "'",
+    "›": "'",
+    "“": '"',
+    "”": '"',
+    "„": '"',
+    "«": '"',
+    "»": '"',
+    "…": "...",
+    "×": "x",
+    "±": "+-",
+    "\xa0": " ",
+}
+# vowels with accents other than the umlauts of the charset
+transliterations.update(
+    (accented, vowel)
+    for vowel, variants in (
+        ("a", "áàâãå"),
+        ("e", "éèêë"),
+        ("i", "íìîï"),
+        ("o", "óòôõ"),
+        ("u", "úùû"),
+        ("A", "ÁÀÂÃÅ"),
+        ("E", "ÉÈÊË"),
+        ("I", "ÍÌÎÏ"),
+        ("O", "ÓÒÔÕ"),
+        ("U", "ÚÙÛ"),
+    )
+    for accented in variants
+)
+
+register_charset("datanorm", charset_translations)
+
+
 def normalize_and_encode(
     charset: Mapping[str, bytes], value: str, field_name=None
 ) -> bytes:
@@ -109,46 +258,58 @@ def normalize_and_encode(
     :param field_name: An optional field name to improve errors
     :return:
     """
-    value = normalize(
-        "NFKC", value
-    )  # normalize composed unicode characters into decomposed ones
+    return get_codec(charset).encode(value, field_name)
 
-    invalid = set(value) - set(charset.keys())
 
-    if invalid:
-        error = "Invalid characters %s in string" % ", ".join(invalid)
-        if field_name:
-            error += " translating field {}".format(field_name)
-        logger.error(error)
+def chunk_text(text, chunk_size, split_char=" "):
+    """
+    Split text into stripped lines of at most chunk_size characters,
+    preferring to break lines at split_char.
+    """
+    return list(iter_chunks(text, chunk_size, split_char))
 
-    return b"".join(charset.get(x, b"") for x in value)
 
+def iter_chunks(text, chunk_size, split_char=" "):
+    """
+    Lazily split text into chunks like chunk_text, in a single pass over
+    offsets instead of slicing off the rest of the line for every chunk.
+    """
+    text = normalize("NFKC", text)
+
+    for line in text.splitlines():
+        end = len(line.rstrip())
+        start = min(len(line) - len(line.lstrip()), end)
+        while end - start > chunk_size:
+            separate_at = line.rfind(split_char, start, start + chunk_size)
+            if separate_at <= start:
+                separate_at = start + chunk_size
+            yield line[start:separate_at]
+            # skip the whitespace at the break, usually a single space
+            start = separate_at
+            while start < end and line[start].isspace():
+                start += 1
+        yield line[start:end]
+
+
+@functools.lru_cache(maxsize=1024)
+def wrap_text(text, chunk_size, split_char=" ") -> tuple:
+    """
+    Cached version of chunk_text returning a tuple, for texts that repeat.
+    """
+    return tuple(iter_chunks(text, chunk_size, split_char))
 
-def chunk_text(text, chunk_size, split_char=" "):
-    text = normalize(
-        "NFKC", text
-    )  # normalize composed unicode characters into decomposed ones
-
-    lines = text.splitlines()
-    chunks = []
-    for line in lines:
-        while True:
-            line = line.strip()
-            if len(line) > chunk_size:
-                separate_at = line[:chunk_size].rfind(split_char)
-                if separate_at == -1:
-                    separate_at = chunk_size
-                chunk, line = line[:separate_at], line[separate_at:]
-                chunks.append(chunk)
-            else:
-                chunks.append(line)
-                break
-    return chunks
+
+def chunk_texts(texts, chunk_size, split_char=" ") -> list:
+    """
+    Wrap many texts at once, returning a tuple of chunks per text. Repeated
+    texts, within the batch or from earlier batches, are only wrapped once.
+    """
+    return [wrap_text(text, chunk_size, split_char) for text in texts]
 
 
 class StringField(FieldBase):
     def __init__(self, values=None, **kwargs):
-        self.values = None
+        self.values = compile_values(values)
         super(StringField, self).__init__(**kwargs)
 
     def process(self, value=None) -> str:
@@ -158,9 +319,11 @@ class StringField(FieldBase):
         if not value and self.required:
             raise ValueError(self.field_name, "Field must not be empty")
 
-        if self.values and value not in self.values:
+        if self.values and not is_allowed(value, self.values):
             raise ValueError(
-                self.field_name, "Value %s not in %s" % (value, self.values)
+                self.field_name,
+                "Value %s not in %s"
+                % (value, ", ".join(sorted(map(str, self.values)))),
             )
 
         if value is None and self.length:
@@ -180,10 +343,41 @@ class StringField(FieldBase):
 
         return value
 
+    def format(self, value=None) -> str:
+        if not value:
+            return ""
+        return str(value).replace("\n", " ")
+
+    def process_column(self, values: list) -> list:
+        # validate columns of strings with set operations, anything unusual
+        # goes through process to get the exact error and row index, as do
+        # fields processing values their own way
+        if (
+            type(self).process is not StringField.process
+            or not values
+            or set(map(type, values)) != {str}
+        ):
+            return super(StringField, self).process_column(values)
+
+        lengths = set(map(len, values))
+        if 0 in lengths and not self.blank:
+            if self.required or self.length or (self.values and "" not in self.values):
+                return super(StringField, self).process_column(values)
+        lengths.discard(0)
+
+        if (
+            (self.length and lengths - {self.length})
+            or (self.max_length and lengths and max(lengths) > self.max_length)
+            or (self.values and set(values) - self.values - {""})
+            or "\n" in "".join(values)
+        ):
+            return super(StringField, self).process_column(values)
+        return values
+
 
 class IntegerField(FieldBase):
     def __init__(self, values=None, **kwargs):
-        self.values = values
+        self.values = compile_values(values)
         super(IntegerField, self).__init__(**kwargs)
 
     def process(self, value=None) -> str:
@@ -192,7 +386,7 @@ class IntegerField(FieldBase):
 
         if value is None and self.length:
             raise ValueError(self.field_name, "Field with fixed length can't be None")
-        if self.values and value not in self.values:
+        if self.values and not is_allowed(value, self.values):
             raise ValueError(self.field_name, "Value %s not allowed" % value)
 
         if self.length:
@@ -214,6 +408,34 @@ class IntegerField(FieldBase):
             )
         return as_bytes
 
+    def format(self, value=None) -> str:
+        if value is None:
+            return ""
+        if self.length:
+            return "%0*d" % (self.length, value)
+        return "%d" % (value,)
+
+    def process_column(self, values: list) -> list:
+        if (
+            type(self).process is not IntegerField.process
+            or not values
+            or set(map(type, values)) != {int}
+            or (self.values and set(values) - self.values)
+        ):
+            return super(IntegerField, self).process_column(values)
+
+        if self.length:
+            return list(map(("%%0%dd" % self.length).__mod__, values))
+
+        processed = list(map(str, values))
+        if self.max_length and max(map(len, processed)) > self.max_length:
+            return super(IntegerField, self).process_column(values)
+        return processed
+
+    def parse(self, text: str):
+        text = text.strip()
+        return int(text) if text else None
+
 
 class ShortDateField(StringField):
     """Format is TTMMJJ"""
@@ -229,10 +451,19 @@ class ShortDateField(StringField):
         if value is None:
             raise ValueError("None is not a valid date")
 
+        return super(ShortDateField, self).process(self.format(value))
+
+    def format(self, value=None) -> str:
+        if not value:
+            return ""
+
         if hasattr(value, "date"):
             value = value.date
 
-        return super(ShortDateField, self).process(value.strftime("%d%m%y"))
+        return value.strftime("%d%m%y")
+
+    def parse(self, text: str):
+        return datetime.strptime(text, "%d%m%y").date() if text.strip() else None
 
 
 class DateField(StringField):
@@ -248,12 +479,19 @@ class DateField(StringField):
         if value is None:
             raise ValueError("None is not a valid date")
 
+        return super(DateField, self).process(self.format(value))
+
+    def format(self, value=None) -> str:
+        if not value:
+            return ""
+
         if hasattr(value, "date"):
             value = value.date
 
-        return super(DateField, self).process(
-            "%04d%02d%02d" % (value.year, value.month, value.day)
-        )
+        return "%04d%02d%02d" % (value.year, value.month, value.day)
+
+    def parse(self, text: str):
+        return datetime.strptime(text, "%Y%m%d").date() if text.strip() else None
 
 
 class CurrencyField(StringField):
@@ -278,11 +516,412 @@ class StaticField(StringField):
             )
         return self.static_value
 
+    def format(self, value=None) -> str:
+        return self.static_value
+
+
+VALIDATION_MODES = ("strict", "trusted", "collect")
+
+
+class RowEncoder(object):
+    """
+    Encoder compiled once per row class and validation mode.
+
+    Static fields are encoded up front and folded together with the
+    separators into a bytes template, so encoding a row only calls one
+    handler per dynamic field and formats the results into the template.
+    Trusted encoders format values with Field.format and skip all checks.
+    """
+
+    def __init__(self, row_class, validation="strict"):
+        if validation not in VALIDATION_MODES:
+            raise ValueError("Unknown validation mode %s" % validation)
+
+        charset = row_class.charset
+        separator = row_class.separator
+        self.codec = get_codec(charset, row_class.transliterations)
+        self.row_class = row_class
+        self.trusted = validation == "trusted"
+
+        template = []
+        self.handlers = []
+        self.static_values = []
+        # the same by position, for encoding tuples
+        self.indexed_handlers = []
+        self.indexed_static_values = []
+        for index, (field_name, field) in enumerate(row_class.base_fields.items()):
+            if isinstance(field, StaticField):
+                encoded = normalize_and_encode(charset, field.static_value, field_name)
+                template.append(encoded.replace(b"%", b"%%"))
+                self.static_values.append((field_name, field.static_value))
+                self.indexed_static_values.append(
+                    (index, field_name, field.static_value)
+                )
+            else:
+                template.append(b"%s")
+                cache_size = field.cache_size
+                if cache_size is None:
+                    cache_size = row_class.cache_size
+                handler = self.field_handler(field, cache_size)
+                self.handlers.append((field_name, handler))
+                self.indexed_handlers.append((index, handler))
+
+        escaped_separator = separator.replace(b"%", b"%%")
+        self.template = escaped_separator.join(template) + escaped_separator
+        # turns the encoded dynamic fields into a record
+        self.join = self.template.__mod__
+        self.fields = row_class.base_fields
+
+    def field_handler(self, field, cache_size=None):
+        """
+        Return a callable turning a raw value into encoded bytes. It raises
+        InvalidCharacters for unmappable characters, which keeps such values
+        out of the cache.
+        """
+        process = field.format if self.trusted else field.process
+        encode = self.codec.encode_checked
+        field_name = field.field_name
+        # transliterations may make valid values too long
+        max_length = None if self.trusted else field.length or field.max_length
+
+        def handler(value):
+            return encode(process(value), field_name, max_length)
+
+        if not cache_size:
+            return handler
+
+        # typed, so that 1 and 1.0 or True don't share an entry
+        cached = functools.lru_cache(maxsize=cache_size, typed=True)(handler)
+
+        def cached_handler(value):
+            try:
+                return cached(value)
+            except TypeError:
+                # unhashable values are not cached
+                return handler(value)
+
+        cached_handler.cache_info = cached.cache_info
+        cached_handler.cache_clear = cached.cache_clear
+        return cached_handler
+
+    def cache_info(self):
+        return dict(
+            (field_name, handler.cache_info())
+            for field_name, handler in self.handlers
+            if hasattr(handler, "cache_info")
+        )
+
+    def encode(self, values: Mapping) -> bytes:
+        return self.join(self.encode_parts(values))
+
+    def encode_parts(self, values: Mapping) -> tuple:
+        """
+        Validate the static fields and encode the dynamic ones of a mapping.
+        """
+        get = values.get
+        for field_name, static_value in () if self.trusted else self.static_values:
+            value = get(field_name)
+            if value is not None and value != static_value:
+                raise ValueError(
+                    field_name, "invalid value %s should be %s" % (value, static_value)
+                )
+        try:
+            return tuple(
+                [handler(get(field_name)) for field_name, handler in self.handlers]
+            )
+        except InvalidCharacters:
+            return tuple(self.encode_lossy(values))
+
+    def encode_tuple(self, values) -> bytes:
+        if len(values) != len(self.fields):
+            raise ValueError(
+                "Expected %d values, got %d" % (len(self.fields), len(values))
+            )
+        static_values = () if self.trusted else self.indexed_static_values
+        for index, field_name, static_value in static_values:
+            value = values[index]
+            if value is not None and value != static_value:
+                raise ValueError(
+                    field_name, "invalid value %s should be %s" % (value, static_value)
+                )
+        try:
+            return self.join(
+                tuple(
+                    [handler(values[index]) for index, handler in self.indexed_handlers]
+                )
+            )
+        except InvalidCharacters:
+            values = dict(zip(self.fields, values))
+            return self.join(tuple(self.encode_lossy(values)))
+
+    def encode_lossy(self, values: Mapping):
+        """
+        Encode fields one by one, dropping and reporting invalid characters.
+        """
+        parts = []
+        for field_name, handler in self.handlers:
+            try:
+                parts.append(handler(values.get(field_name)))
+            except InvalidCharacters as e:
+                report_invalid(e.characters, field_name, values, self.row_class)
+                parts.append(e.encoded)
+        return parts
+
+    def encode_columns(self, columns) -> Iterator[bytes]:
+        """
+        Encode rows given as columns, a mapping of field names to equally long
+        sequences of values or an arrow record batch.
+        """
+        if hasattr(columns, "to_pydict"):
+            columns = columns.to_pydict()
+        columns = dict(
+            (name, column_values(values)) for name, values in columns.items()
+        )
+
+        unknown = set(columns) - set(self.fields)
+        if unknown:
+            raise ValueError("Unknown columns %s" % ", ".join(sorted(unknown)))
+        sizes = set(map(len, columns.values()))
+        if len(sizes) > 1:
+            raise ValueError("Columns differ in length")
+        size = sizes.pop() if sizes else 0
+
+        for field_name, static_value in () if self.trusted else self.static_values:
+            column = columns.get(field_name)
+            if column and set(column) - {None, static_value}:
+                for index, value in enumerate(column):
+                    if value is not None and value != static_value:
+                        raise RowError(
+                            index,
+                            field_name,
+                            "invalid value %s should be %s" % (value, static_value),
+                        )
+
+        encoded = []
+        for field_name, handler in self.handlers:
+            field = self.fields[field_name]
+            if field_name in columns and self.trusted:
+                processed = list(map(field.format, columns[field_name]))
+                encoded.append(self.encode_column(field_name, processed, columns))
+            elif field_name in columns:
+                processed = field.process_column(columns[field_name])
+                column = self.encode_column(field_name, processed, columns)
+                self.check_column_length(field, processed, column)
+                encoded.append(column)
+            elif size:
+                try:
+                    encoded.append([handler(None)] * size)
+                except InvalidCharacters as e:
+                    encoded.append([e.encoded] * size)
+                except ValueError as e:
+                    raise RowError.from_error(0, field_name, e) from e
+
+        if not self.handlers:
+            return iter([self.join(())] * size)
+        return map(self.join, zip(*encoded))
+
+    def encode_column(self, field_name, values: list, columns) -> list:
+        """
+        Encode the processed values of a column, reporting invalid characters
+        with the values of their row like encode_lossy.
+        """
+        encoded = self.codec.encode_joined(values)
+        if encoded is not None:
+            return encoded
+
+        encode = self.codec.encode_checked
+        encoded = []
+        for index, value in enumerate(values):
+            try:
+                encoded.append(encode(value))
+            except InvalidCharacters as e:
+                row = dict((name, column[index]) for name, column in columns.items())
+                report_invalid(e.characters, field_name, row, self.row_class)
+                encoded.append(e.encoded)
+        return encoded
+
+    @staticmethod
+    def check_column_length(field, values: list, column: list):
+        """
+        Raise a RowError for the first encoded value that transliteration
+        made longer than the field allows. ASCII values, checked by
+        process_column, are never encoded longer.
+        """
+        max_length = field.length or field.max_length
+        if not max_length or not column or "".join(values).isascii():
+            return
+        if max(map(len, column)) <= max_length:
+            return
+        for index, value in enumerate(column):
+            if len(value) > max_length:
+                raise RowError(
+                    index,
+                    field.field_name,
+                    "Value longer than %d characters after transliteration"
+                    % max_length,
+                )
+
+    def encode_many(self, rows, line_separator=b"\r\n", buffer=None) -> bytearray:
+        """
+        Encode a batch of mappings into one block of records, each followed
+        by line_separator. Invalid rows raise a RowError with their index.
+
+        :param buffer: A bytearray to reuse for the block.
+        """
+        buffer = bytearray() if buffer is None else buffer
+        del buffer[:]
+        encode = self.encode
+        for index, values in enumerate(rows):
+            try:
+                buffer += encode(values)
+            except ValueError as e:
+                raise RowError.from_error(index, None, e) from e
+            buffer += line_separator
+        return buffer
+
+
+class FixedWidthEncoder(RowEncoder):
+    """
+    Encoder for rows without separator, whose fields sit at fixed byte
+    offsets.
+
+    The offset and width of every field, its length or max_length, are
+    computed once. Records start as a copy of a blank record holding the
+    static fields and row_class.fill padding, the encoded fields are written
+    into it through memoryview slices and checked against their width while
+    writing.
+    """
+
+    def __init__(self, row_class, validation="strict"):
+        super(FixedWidthEncoder, self).__init__(row_class, validation)
+
+        fill = row_class.fill
+        blank = bytearray()
+        # (field name, offset, width) per dynamic field
+        self.layout = []
+        # the same for all fields, for parsing records
+        self.offsets = []
+        for field_name, field in row_class.base_fields.items():
+            if isinstance(field, StaticField):
+                encoded = normalize_and_encode(
+                    row_class.charset, field.static_value, field_name
+                )
+                self.offsets.append((field_name, len(blank), len(encoded)))
+                blank += encoded
+                continue
+            width = field.length or field.max_length
+            if not width:
+                raise TypeError(
+                    "Field %s of %s needs a length or max_length for fixed width "
+                    "records" % (field_name, row_class.__name__)
+                )
+            self.layout.append((field_name, len(blank), width))
+            self.offsets.append((field_name, len(blank), width))
+            blank += fill * width
+
+        record_length = row_class.record_length
+        if record_length is not None and len(blank) != record_length:
+            raise TypeError(
+                "%s records have %d bytes instead of %d"
+                % (row_class.__name__, len(blank), record_length)
+            )
+        self.record_length = len(blank)
+        self.blank = bytes(blank)
+        self.join = self.pack
+
+    def pack(self, parts) -> bytes:
+        record = bytearray(self.blank)
+        self.pack_into(record, 0, parts)
+        return bytes(record)
+
+    def pack_into(self, buffer, offset, parts):
+        """
+        Write the encoded dynamic fields into buffer, which holds a blank
+        record at offset.
+        """
+        with memoryview(buffer) as view:
+            for (field_name, start, width), part in zip(self.layout, parts):
+                size = len(part)
+                if size > width:
+                    raise ValueError(
+                        field_name,
+                        "Encoded value of %d bytes longer than the field width %d"
+                        % (size, width),
+                    )
+                start += offset
+                view[start : start + size] = part
+
+    def encode_many(self, rows, line_separator=b"\r\n", buffer=None) -> bytearray:
+        rows = rows if isinstance(rows, list) else list(rows)
+        line = self.blank + line_separator
+        buffer = bytearray() if buffer is None else buffer
+        # keeps the allocation of a reused buffer of the same size
+        buffer[:] = line * len(rows)
+
+        get_parts = self.encode_parts
+        pack_into = self.pack_into
+        for index, values in enumerate(rows):
+            try:
+                pack_into(buffer, index * len(line), get_parts(values))
+            except ValueError as e:
+                raise RowError.from_error(index, None, e) from e
+        return buffer
+
+
+class CompactRecord(object):
+    """
+    Base for the tuple backed records of row classes, see RowBase.Record.
+    """
+
+    __slots__ = ()
+    row_class = None
+
+    @property
+    def output(self) -> bytes:
+        return self.row_class.encode_tuple(self)
+
+
+def record_type(row_class):
+    """
+    Create a namedtuple with one item per field of row_class, defaulting to
+    None, that encodes itself like a row. Fields that are no valid item
+    names, like _intern, get positional names (_0, _1, ...).
+    """
+    field_names = list(row_class.base_fields)
+    base = namedtuple(
+        row_class.__name__ + "Record",
+        field_names,
+        defaults=[None] * len(field_names),
+        rename=True,
+    )
+    record = type(
+        base.__name__,
+        (base, CompactRecord),
+        {"__slots__": (), "row_class": row_class, "__module__": row_class.__module__},
+    )
+    # lets pickle find the record type as an attribute of the row class
+    record.__qualname__ = row_class.__qualname__ + ".Record"
+    return record
+
+
+# an RLock, as the collect encoder is created through the strict one
+_encoders_lock = threading.RLock()
+
 
 class RowMeta(type):
     def __new__(cls, name, bases, attrs):
         attrs["base_fields"] = get_declared_fields(bases, attrs)
+        attrs["fields"] = attrs["base_fields"]
+        # the allowed values per field, for validating batches and columns
+        attrs["constraints"] = dict(
+            (field_name, field.values)
+            for field_name, field in attrs["base_fields"].items()
+            if getattr(field, "values", None)
+        )
         new_class = super(RowMeta, cls).__new__(cls, name, bases, attrs)
+        # encoders per validation mode, created on first use
+        new_class._encoders = {}
+        new_class.Record = record_type(new_class)
         return new_class
 
 
@@ -290,9 +929,24 @@ class RowBase(object, metaclass=RowMeta):
     base_fields = OrderedDict()
     separator = b";"
     charset = charset_translations
+    # when set, values of all fields without their own cache_size are cached
+    cache_size = None
+    # a Diagnostics collector for invalid characters, used when no other
+    # collector is active
+    diagnostics = None
+    # "strict" validates every value, "trusted" skips all checks except
+    # encoding for input that was validated before, "collect" validates like
+    # strict but makes DatanormWriter skip invalid rows and collect errors
+    validation = "strict"
+    # characters replaced before encoding, None to drop everything missing
+    # from charset
+    transliterations = transliterations
+    # padding of fixed width rows, the ones without separator, and their
+    # length in bytes if it is prescribed
+    fill = b" "
+    record_length = None
 
     def __init__(self, **kwargs):
-        self.fields = self.base_fields
         super(RowBase, self).__init__()
         self.values = {}
         for field_name in self.fields:
@@ -306,16 +960,113 @@ class RowBase(object, metaclass=RowMeta):
 
     @property
     def output(self) -> bytes:
-        return (
-            self.separator.join(
-                normalize_and_encode(
-                    self.charset, field.process(self.values[field_name]), field_name
+        return self.encode(self.values)
+
+    @classmethod
+    def encoder(cls, validation=None) -> RowEncoder:
+        """
+        Return the encoder for a validation mode, defaulting to
+        cls.validation.
+        """
+        validation = validation or cls.validation
+        try:
+            return cls._encoders[validation]
+        except KeyError:
+            pass
+        with _encoders_lock:
+            if validation not in cls._encoders:
+                # only the writer handles collect differently
+                if validation == "collect":
+                    encoder = cls.encoder("strict")
+                elif not cls.separator:
+                    encoder = FixedWidthEncoder(cls, validation)
+                else:
+                    encoder = RowEncoder(cls, validation)
+                cls._encoders[validation] = encoder
+            return cls._encoders[validation]
+
+    @classmethod
+    def encode(cls, values: Mapping, validation=None) -> bytes:
+        """
+        Encode a mapping of field values without creating a row instance.
+        Missing fields are treated as None, unknown keys are ignored.
+        """
+        return cls.encoder(validation).encode(values)
+
+    @classmethod
+    def encode_tuple(cls, values, validation=None) -> bytes:
+        """
+        Encode a sequence with one value per field in declaration order, like
+        the compact cls.Record tuples, without creating a row instance.
+        """
+        return cls.encoder(validation).encode_tuple(values)
+
+    @classmethod
+    def parse(cls, record: bytes, errors="strict"):
+        """
+        Create a row from an encoded record, the reverse of output.
+
+        Records are split at the separator, rows without a separator are read
+        as fixed width records using the layout of their encoder. The fill
+        padding is stripped from fields without a fixed length.
+        """
+        decode = get_codec(cls.charset).decode
+        fields = cls.base_fields
+
+        if cls.separator:
+            parts = record.split(cls.separator)
+            if parts[-1] == b"":
+                parts.pop()
+            if len(parts) != len(fields):
+                raise ValueError(
+                    "%s expects %d fields, got %d"
+                    % (cls.__name__, len(fields), len(parts))
                 )
-                for (field_name, field) in list(self.fields.items())
+        else:
+            encoder = cls.encoder()
+            if len(record) != encoder.record_length:
+                raise ValueError(
+                    "%s expects %d bytes, got %d"
+                    % (cls.__name__, encoder.record_length, len(record))
+                )
+            parts = []
+            for field_name, offset, width in encoder.offsets:
+                part = record[offset : offset + width]
+                if not fields[field_name].length:
+                    part = part.rstrip(cls.fill)
+                parts.append(part)
+
+        return cls(
+            **dict(
+                (field_name, field.parse(decode(part, errors)))
+                for (field_name, field), part in zip(fields.items(), parts)
             )
-            + self.separator
         )
 
+    @classmethod
+    def encode_columns(cls, columns, validation=None) -> Iterator[bytes]:
+        """
+        Encode rows given as a mapping of field names to columns of values
+        (lists, numpy arrays) or an arrow record batch. Lengths and allowed
+        values are validated per column, errors carry the row index.
+        """
+        return cls.encoder(validation).encode_columns(columns)
+
+    @classmethod
+    def encode_many(cls, rows, validation=None, line_separator=b"\r\n") -> bytes:
+        """
+        Encode a batch of mappings into one block of records, each followed
+        by line_separator. Invalid rows raise a RowError with their index.
+        """
+        return bytes(cls.encoder(validation).encode_many(rows, line_separator))
+
+    @classmethod
+    def cache_info(cls):
+        """
+        Return the hits, misses and size of the value caches per field.
+        """
+        return cls.encoder().cache_info()
+
 
 class ChoiceMeta(type):
     def __new__(cls, name, bases, attrs):
@@ -0,0 +1,299 @@
+"""
+Convert CSV or JSON Lines input into a datanorm file.
+
+    datanorm-writer products.csv --mapping mapping.json -o DATANORM.001
+
+The mapping is a JSON object with
+
+- header: the values of the VorlaufZeile, erstellungsdatum as ISO date
+- records: names of the row classes written per input row, by default
+  Artikelzeile and Artikelzeile2
+- columns: field names mapped to input column names, fields that are not
+  mapped are read from the column of the same name if there is one
+- values: constant field values for every row
+
+Only the modules needed for the given options are imported.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+DEFAULT_RECORDS = ("Artikelzeile", "Artikelzeile2")
+
+
+def text_parser(field):
+    """
+    Return the function converting text read from the input into a value
+    for field. Text is parsed like datanorm text, but dates are expected as
+    ISO dates.
+    """
+    from datetime import date
+
+    from .base import DateField, ShortDateField
+
+    if isinstance(field, (DateField, ShortDateField)):
+        return date.fromisoformat
+    return field.parse
+
+
+def convert_value(parse, value):
+    if not isinstance(value, str):
+        return value
+    if not value:
+        return None
+    return parse(value)
+
+
+class Converter(object):
+    """
+    Encode input rows, mappings of column names to values, into one record
+    per row class. The records of a row are returned as a list, so an
+    invalid row is skipped as a whole.
+    """
+
+    def __init__(self, row_classes, columns=None, values=None, validation=None):
+        columns = columns or {}
+        values = values or {}
+        fields = set()
+        for row_class in row_classes:
+            fields.update(row_class.base_fields)
+        unknown = (set(columns) | set(values)) - fields
+        if unknown:
+            raise ValueError("Unknown fields %s" % ", ".join(sorted(unknown)))
+
+        self.row_classes = row_classes
+        self.validation = validation
+        # (field name, input column, constant, parse) per dynamic field of
+        # each class
+        self.sources = []
+        for row_class in row_classes:
+            sources = []
+            for field_name, field in row_class.base_fields.items():
+                if hasattr(field, "static_value"):
+                    continue
+                parse = text_parser(field)
+                constant = convert_value(parse, values.get(field_name))
+                column = columns.get(field_name, field_name)
+                sources.append((field_name, column, constant, parse))
+            self.sources.append(sources)
+
+    def __call__(self, row) -> list:
+        get = row.get
+        records = []
+        for row_class, sources in zip(self.row_classes, self.sources):
+            values = {}
+            for field_name, column, constant, parse in sources:
+                if constant is not None:
+                    values[field_name] = constant
+                    continue
+                try:
+                    values[field_name] = convert_value(parse, get(column))
+                except ValueError as e:
+                    raise ValueError(field_name, str(e)) from e
+            records.append(row_class.encode(values, self.validation))
+        return records
+
+
+def read_csv(file, delimiter):
+    import csv
+
+    return csv.DictReader(file, delimiter=delimiter)
+
+
+def read_jsonl(file):
+    import json
+
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def header_values(header_class, header):
+    """
+    Convert the header values of the mapping, padding texts to the length
+    of their fields.
+    """
+    from .base import StringField
+
+    unknown = set(header) - set(header_class.base_fields)
+    if unknown:
+        raise ValueError("Unknown header fields %s" % ", ".join(sorted(unknown)))
+
+    values = {}
+    for field_name, field in header_class.base_fields.items():
+        if hasattr(field, "static_value"):
+            continue
+        value = convert_value(text_parser(field), header.get(field_name))
+        if type(field) is StringField and field.length:
+            value = (value or "").ljust(field.length)
+        values[field_name] = value
+    return values
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="datanorm-writer", description="Convert CSV or JSON Lines to datanorm."
+    )
+    parser.add_argument("input", help="input file, - for stdin")
+    parser.add_argument("--mapping", required=True, help="JSON mapping file")
+    parser.add_argument("-o", "--output", default="-", help="output file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format")
+    parser.add_argument("--delimiter", default=",", help="CSV delimiter")
+    parser.add_argument("--encoding", default="utf-8", help="input encoding")
+    parser.add_argument(
+        "--validation", choices=("strict", "trusted", "collect"), default="strict"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes or threads encoding rows",
+    )
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="encode on threads instead of processes, for free-threaded Python",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument(
+        "--buffer-size", type=int, default=64 * 1024, help="output buffer in bytes"
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="print throughput and memory use"
+    )
+    parser.add_argument(
+        "--checkpoint", help="JSON file recording the progress of the export"
+    )
+    parser.add_argument("--checkpoint-interval", type=int, default=10000)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted export from its checkpoint",
+    )
+    args = parser.parse_args(argv)
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+    if args.checkpoint and args.output == "-":
+        parser.error("--checkpoint requires an output file")
+    if args.format is None:
+        args.format = "jsonl" if args.input.endswith((".jsonl", ".ndjson")) else "csv"
+    return args
+
+
+def peak_memory(children=False):
+    """
+    Return the peak resident memory of this process in bytes, or with
+    children that of the largest finished worker process.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import json
+    import logging
+
+    logging.basicConfig(format="%(message)s")
+
+    from . import rows
+    from .writer import DatanormWriter
+
+    with open(args.mapping, encoding="utf-8") as f:
+        mapping = json.load(f)
+
+    row_classes = []
+    for name in mapping.get("records", DEFAULT_RECORDS):
+        row_class = getattr(rows, name, None)
+        if not isinstance(row_class, type) or not issubclass(row_class, rows.RowBase):
+            raise SystemExit("Unknown record type %s" % name)
+        row_classes.append(row_class)
+    converter = Converter(
+        row_classes, mapping.get("columns"), mapping.get("values"), args.validation
+    )
+    header = header_values(DatanormWriter.header_class, mapping.get("header", {}))
+
+    if args.input == "-":
+        input_file = sys.stdin
+    else:
+        input_file = open(args.input, encoding=args.encoding, newline="")
+    if args.output == "-":
+        output_file = sys.stdout.buffer
+    elif args.resume and os.path.exists(args.output):
+        output_file = open(args.output, "r+b")
+    else:
+        output_file = open(args.output, "wb")
+
+    start = time.perf_counter()
+    try:
+        if args.format == "csv":
+            input_rows = read_csv(input_file, args.delimiter)
+        else:
+            input_rows = read_jsonl(input_file)
+
+        writer = DatanormWriter(
+            output_file,
+            header=header,
+            buffer_size=args.buffer_size,
+            validation=args.validation,
+            checkpoint=args.checkpoint,
+            checkpoint_interval=args.checkpoint_interval,
+            resume=args.resume,
+        )
+        if args.jobs > 1:
+            writer.write_rows_parallel(
+                input_rows,
+                max_workers=args.jobs,
+                chunk_size=args.chunk_size,
+                encode=converter,
+                threads=args.threads,
+            )
+        else:
+            writer.write_rows(input_rows, encode=converter)
+        stats = writer.close()
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout.buffer:
+            output_file.close()
+    seconds = time.perf_counter() - start
+
+    for error in writer.errors:
+        print(
+            "input row %d, field %s: %s"
+            % (error.index + 1, error.field_name, error.message),
+            file=sys.stderr,
+        )
+    if args.stats:
+        memory = "peak memory %s bytes" % peak_memory()
+        if args.jobs > 1 and not args.threads:
+            # the rows are encoded in worker processes, not counted above
+            memory += ", largest worker %s bytes" % peak_memory(children=True)
+        print(
+            "%d input rows, %d skipped, %d records, %d bytes in %.2fs, "
+            "%.0f rows/sec, %s"
+            % (
+                writer.rows_read,
+                len(writer.errors),
+                stats["rows"],
+                stats["bytes"],
+                seconds,
+                writer.rows_read / seconds if seconds else 0,
+                memory,
+            ),
+            file=sys.stderr,
+        )
+    return 1 if writer.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import codecs
+import re
+import threading
+from typing import Mapping
+from unicodedata import normalize
+
+from .diagnostics import report_invalid
+
+UNDEFINED = "\ufffe"
+
+
+def build_tables(charset: Mapping[str, bytes]):
+    """
+    Build charmap encoding and decoding tables from a charset mapping.
+
+    Single byte charsets without duplicate targets are compiled into a C level
+    EncodingMap, everything else falls back to a dict keyed by code point,
+    which the charmap codec also understands.
+    """
+    chars = dict((key, value) for key, value in charset.items() if len(key) == 1)
+    single_bytes = all(len(value) == 1 for value in chars.values())
+    targets = [value[0] for value in chars.values() if len(value) == 1]
+
+    if single_bytes and len(set(targets)) == len(targets):
+        decoding = [UNDEFINED] * 256
+        for key, value in chars.items():
+            decoding[value[0]] = key
+        decoding_table = "".join(decoding)
+        return codecs.charmap_build(decoding_table), decoding_table
+
+    encoding_table = dict((ord(key), value) for key, value in chars.items())
+    decoding_table = dict(
+        (value[0], key) for key, value in chars.items() if len(value) == 1
+    )
+    return encoding_table, decoding_table
+
+
+class InvalidCharacters(Exception):
+    """
+    Raised by CharsetCodec.encode_checked for values with characters missing
+    from the charset, carrying the encoding with those characters dropped.
+    """
+
+    def __init__(self, encoded: bytes, characters):
+        super(InvalidCharacters, self).__init__(encoded, characters)
+        self.encoded = encoded
+        self.characters = characters
+
+
+class CharsetCodec(object):
+    """
+    Translate strings into a datanorm charset using the charmap codec.
+
+    Pure ASCII values are encoded directly, everything else is NFKC
+    normalized and transliterated first. Characters missing from the charset
+    are dropped and reported to the active Diagnostics collector.
+
+    :param transliterations: An optional mapping of non ASCII characters to
+        replacement strings, compiled into one regular expression.
+    """
+
+    def __init__(
+        self, charset: Mapping[str, bytes], transliterations: Mapping[str, str] = None
+    ):
+        self.charset = charset
+        self.characters = frozenset(charset)
+        self.encoding_table, self.decoding_table = build_tables(charset)
+
+        self.transliterations = transliterations
+        self.transliterated = None
+        if transliterations:
+            ascii_keys = [key for key in transliterations if key.isascii()]
+            if ascii_keys:
+                raise ValueError(
+                    "Only non ASCII characters can be transliterated, got %s"
+                    % ", ".join(map(repr, ascii_keys))
+                )
+            # substituting only the matches is much faster than str.translate,
+            # which looks up every character of a non ASCII string
+            self.transliterated = re.compile(
+                "[%s]" % re.escape("".join(transliterations))
+            )
+            self.replacements = dict(transliterations)
+
+        # ASCII characters that are not encoded as themselves. Deleting them
+        # with str.translate is a fast check whether a long ASCII string can
+        # be encoded with the much faster ascii codec.
+        non_identity = "".join(
+            chr(i) for i in range(128) if charset.get(chr(i)) != bytes((i,))
+        )
+        self.column_ascii_filter = str.maketrans("", "", non_identity.replace("\n", ""))
+
+        # used to encode whole columns joined by newlines in one call
+        self.column_table = None
+        if "\n" not in self.characters:
+            column_charset = dict(charset)
+            column_charset["\n"] = b"\n"
+            self.column_table = build_tables(column_charset)[0]
+
+    def clean(self, value: str) -> str:
+        """
+        Normalize and transliterate a non ASCII value.
+        """
+        value = normalize("NFKC", value)
+        if self.transliterated is not None:
+            value = self.transliterated.sub(self.transliterate, value)
+        return value
+
+    def transliterate(self, match) -> str:
+        # like str.translate, None drops the character
+        return self.replacements[match.group()] or ""
+
+    def encode(self, value: str, field_name=None) -> bytes:
+        if not value.isascii():
+            value = self.clean(value)
+        try:
+            return codecs.charmap_encode(value, "strict", self.encoding_table)[0]
+        except UnicodeEncodeError:
+            return self.encode_lossy(value, field_name)
+
+    def encode_checked(self, value: str, field_name=None, max_length=None) -> bytes:
+        """
+        Like encode but raise InvalidCharacters instead of dropping them.
+
+        :param max_length: Raise a ValueError for values that normalization
+            or transliteration made longer than max_length once encoded.
+        """
+        if value.isascii():
+            # ASCII values are never encoded longer
+            max_length = None
+        else:
+            value = self.clean(value)
+        try:
+            encoded = codecs.charmap_encode(value, "strict", self.encoding_table)[0]
+            invalid = None
+        except UnicodeEncodeError:
+            encoded = codecs.charmap_encode(value, "ignore", self.encoding_table)[0]
+            invalid = set(value) - self.characters
+        if max_length and len(encoded) > max_length:
+            raise ValueError(
+                field_name,
+                "Value longer than %d characters after transliteration" % max_length,
+            )
+        if invalid:
+            raise InvalidCharacters(encoded, invalid)
+        return encoded
+
+    def encode_column(self, values, field_name=None):
+        """
+        Encode a list of strings without newlines, returning a list of bytes.
+
+        The values are joined by newlines, so normalization and encoding happen
+        in a single call for the whole column. Columns with characters missing
+        from the charset are encoded value by value.
+        """
+        encoded = self.encode_joined(values)
+        if encoded is not None:
+            return encoded
+        encode = self.encode
+        return [encode(value, field_name) for value in values]
+
+    def encode_joined(self, values):
+        """
+        Encode a column in a single call like encode_column, returning None
+        when it has to be encoded value by value.
+        """
+        if self.column_table is None or not values:
+            return None
+        joined = "\n".join(values)
+        if joined.isascii():
+            if len(joined.translate(self.column_ascii_filter)) == len(joined):
+                return joined.encode("ascii").split(b"\n")
+        else:
+            joined = self.clean(joined)
+        try:
+            encoded = codecs.charmap_encode(joined, "strict", self.column_table)
+        except UnicodeEncodeError:
+            return None
+        parts = encoded[0].split(b"\n")
+        if len(parts) == len(values):
+            return parts
+        return None
+
+    def encode_lossy(self, value: str, field_name=None) -> bytes:
+        report_invalid(set(value) - self.characters, field_name)
+        return codecs.charmap_encode(value, "ignore", self.encoding_table)[0]
+
+    def decode(self, data: bytes, errors="strict") -> str:
+        return codecs.charmap_decode(data, errors, self.decoding_table)[0]
+
+    def codec_info(self, name) -> codecs.CodecInfo:
+        def encode(value, errors="strict"):
+            if not value.isascii():
+                value = normalize("NFKC", value)
+            return codecs.charmap_encode(value, errors, self.encoding_table)
+
+        def decode(data, errors="strict"):
+            return codecs.charmap_decode(data, errors, self.decoding_table)
+
+        return codecs.CodecInfo(encode, decode, name=name)
+
+
+_codecs = {}
+_codecs_lock = threading.Lock()
+_registered = {}
+
+
+def get_codec(
+    charset: Mapping[str, bytes], transliterations: Mapping[str, str] = None
+) -> CharsetCodec:
+    """
+    Return the cached codec for a charset mapping and an optional mapping
+    of transliterations.
+
+    Codecs are cached per mapping object, changes made to a mapping after
+    it has been used for encoding are not picked up.
+    """
+    key = (id(charset), id(transliterations))
+    try:
+        return _codecs[key][-1]
+    except KeyError:
+        pass
+    with _codecs_lock:
+        if key not in _codecs:
+            # keep references to the mappings so their ids are not reused
+            _codecs[key] = (
+                charset,
+                transliterations,
+                CharsetCodec(charset, transliterations),
+            )
+        return _codecs[key][-1]
+
+
+def _search(name):
+    return _registered.get(name.replace("-", "_"))
+
+
+def register_charset(name, charset: Mapping[str, bytes]):
+    """
+    Register a charset mapping as a python codec, so it can be used with
+    str.encode and bytes.decode.
+    """
+    if not _registered:
+        codecs.register(_search)
+    name = name.lower().replace("-", "_")
+    _registered[name] = get_codec(charset).codec_info(name)
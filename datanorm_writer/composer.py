@@ -0,0 +1,388 @@
+import hashlib
+import itertools
+from array import array
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterator, Mapping
+from unicodedata import normalize
+
+from .base import RowError, chunk_texts, column_values, wrap_text
+from .rows import Artikelzeile, Artikelzeile2, Langtextzeile, Staffelpreiszeile
+
+PRICE_UNITS = ("euro", "cent")
+
+
+def to_cents(price, unit="euro") -> int:
+    """
+    Convert a price into cents. Prices in euros, numbers or numeric strings,
+    are rounded half up to whole cents, prices in cents have to be whole.
+
+    :param unit: The unit of price, "euro" or "cent", applied to every type
+        of number alike.
+    """
+    if unit not in PRICE_UNITS:
+        raise ValueError("Unknown price unit %s" % unit)
+    if not isinstance(price, Decimal):
+        # str keeps the shortest repr of floats and handles numpy numbers
+        price = Decimal(str(price))
+    if unit == "euro":
+        return int((price * 100).to_integral_value(ROUND_HALF_UP))
+    if price != price.to_integral_value():
+        raise ValueError("Price %s has fractions of a cent" % price)
+    return int(price)
+
+
+class LangtextIndex(object):
+    """
+    Assign one langtextnummer per distinct long text.
+
+    Texts are identified by a blake2b digest of the normalized text, so the
+    index only keeps a digest to number mapping and the encoded size of the
+    records of every text, which is used to report the bytes saved.
+    """
+
+    digest_size = 16
+    # size of the line separator written after every record
+    separator_size = 2
+
+    def __init__(self, start=1):
+        self.start = start
+        self.numbers = {}
+        self.sizes = array("Q")
+        self.duplicates = 0
+        self.bytes_saved = 0
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def digest(self, text) -> bytes:
+        lines = normalize("NFKC", text).splitlines()
+        text = "\n".join(line.strip() for line in lines)
+        return hashlib.blake2b(
+            text.encode("utf-8"), digest_size=self.digest_size
+        ).digest()
+
+    def lookup(self, text):
+        """
+        Return the langtextnummer for text and whether it is new. Repeated
+        texts are counted as duplicates.
+        """
+        digest = self.digest(text)
+        number = self.numbers.get(digest)
+        if number is not None:
+            self.duplicates += 1
+            self.bytes_saved += self.sizes[number - self.start]
+            return "%d" % number, False
+
+        number = self.start + len(self.sizes)
+        self.numbers[digest] = number
+        self.sizes.append(0)
+        return "%d" % number, True
+
+    def add_records(self, langtextnummer, records) -> Iterator[bytes]:
+        """
+        Pass through the records of a new text, recording their size.
+        """
+        index = int(langtextnummer) - self.start
+        for record in records:
+            self.sizes[index] += len(record) + self.separator_size
+            yield record
+
+    @property
+    def stats(self):
+        return {
+            "texts": len(self.numbers),
+            "duplicates": self.duplicates,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+class ProductComposer(object):
+    """
+    Turn product mappings into the encoded records of one article, in the
+    order A, B, T, Z.
+
+    A product mapping contains the values of the Artikelzeile and
+    Artikelzeile2 fields by name, plus optionally
+
+    - langtext: the long text, wrapped into Langtextzeile records
+    - staffelpreise: a sequence of mappings with Staffelpreiszeile values,
+      satznummer is counted automatically
+
+    Products without a langtextnummer get a running number assigned when
+    they have a long text, or the number of an identical text when a
+    LangtextIndex is used, in which case the T records of every text are
+    only written once. A missing textkennzeichen is derived from the texts
+    that are present.
+    """
+
+    artikel_class = Artikelzeile
+    artikel2_class = Artikelzeile2
+    langtext_class = Langtextzeile
+    staffelpreis_class = Staffelpreiszeile
+
+    def __init__(
+        self, verarbeitungsmerker="N", langtextnummer_start=1, langtext_index=None
+    ):
+        self.verarbeitungsmerker = verarbeitungsmerker
+        self.langtext_index = langtext_index
+        self._langtextnummern = itertools.count(langtextnummer_start)
+
+    def next_langtextnummer(self) -> str:
+        return "%d" % next(self._langtextnummern)
+
+    def compose(self, product: Mapping, verarbeitungsmerker=None) -> Iterator[bytes]:
+        """
+        Yield the encoded records for a single product.
+        """
+        verarbeitungsmerker = verarbeitungsmerker or self.verarbeitungsmerker
+        values = dict(product, verarbeitungsmerker=verarbeitungsmerker)
+
+        langtext = values.pop("langtext", None)
+        staffelpreise = values.pop("staffelpreise", None) or ()
+        write_langtext = bool(langtext)
+        if langtext and not values.get("langtextnummer"):
+            if self.langtext_index is not None:
+                number, write_langtext = self.langtext_index.lookup(langtext)
+                values["langtextnummer"] = number
+            else:
+                values["langtextnummer"] = self.next_langtextnummer()
+        if not values.get("textkennzeichen"):
+            values["textkennzeichen"] = self.textkennzeichen(values, bool(langtext))
+
+        yield self.artikel_class.encode(values)
+        yield self.artikel2_class.encode(values)
+
+        if write_langtext:
+            records = self.langtext_records(
+                values["langtextnummer"], langtext, verarbeitungsmerker
+            )
+            if self.langtext_index is not None:
+                records = self.langtext_index.add_records(
+                    values["langtextnummer"], records
+                )
+            yield from records
+
+        encode_staffelpreis = self.staffelpreis_class.encode
+        for satznummer, staffelpreis in enumerate(staffelpreise, 1):
+            yield encode_staffelpreis(
+                dict(
+                    staffelpreis,
+                    verarbeitungsmerker=verarbeitungsmerker,
+                    artikelnummer=values.get("artikelnummer"),
+                    satznummer=satznummer,
+                )
+            )
+
+    def compose_deletion(self, artikelnummer) -> Iterator[bytes]:
+        """
+        Yield the records deleting an article, an Artikelzeile with
+        verarbeitungsmerker L.
+        """
+        row = self.artikel_class
+        yield row.encode(
+            {
+                "verarbeitungsmerker": "L",
+                "artikelnummer": artikelnummer,
+                "textkennzeichen": row.TEXT_KURZ1_KURZ2 + row.TEXT_HAS_KURZ2_FALSE,
+                "preiskennzeichen": row.PREIS_LISTENPREIS,
+                "preiseinheit": row.PRICE_BY_1_UNIT,
+            }
+        )
+
+    def compose_all(self, products) -> Iterator[bytes]:
+        """
+        Yield the encoded records for a stream of products, to be passed to
+        DatanormWriter.write_records.
+        """
+        for product in products:
+            yield from self.compose(product)
+
+    def langtext_records(
+        self, langtextnummer, text, verarbeitungsmerker=None
+    ) -> Iterator[bytes]:
+        """
+        Wrap text into lines and yield one Langtextzeile per pair of lines.
+        """
+        verarbeitungsmerker = verarbeitungsmerker or self.verarbeitungsmerker
+        line_length = self.langtext_class.base_fields["langtextzeile_1"].max_length
+        encode = self.langtext_class.encode
+
+        lines = iter(wrap_text(self.clean_langtext(text), line_length))
+        # zipping an iterator with itself pairs consecutive lines
+        for index, (line_1, line_2) in enumerate(itertools.zip_longest(lines, lines)):
+            yield encode(
+                {
+                    "verarbeitungsmerker": verarbeitungsmerker,
+                    "langtextnummer": langtextnummer,
+                    "zeilennummer_1": 2 * index + 1,
+                    "langtextzeile_1": line_1,
+                    "zeilennummer_2": 2 * index + 2 if line_2 is not None else None,
+                    "langtextzeile_2": line_2,
+                }
+            )
+
+    def clean_langtext(self, text: str) -> str:
+        """
+        Normalize and transliterate a long text like the Langtextzeile codec
+        does, so lines are wrapped at the length they are encoded with.
+        """
+        if text.isascii():
+            return text
+        return self.langtext_class.encoder().codec.clean(text)
+
+    def langtext_batch(self, langtexts, verarbeitungsmerker=None) -> Iterator[bytes]:
+        """
+        Return the Langtextzeile records for many (langtextnummer, text) pairs,
+        like langtext_records, wrapping all texts with chunk_texts and
+        encoding the records column by column.
+        """
+        verarbeitungsmerker = verarbeitungsmerker or self.verarbeitungsmerker
+        line_length = self.langtext_class.base_fields["langtextzeile_1"].max_length
+        langtexts = list(langtexts)
+        clean = self.clean_langtext
+        wrapped = chunk_texts([clean(text) for number, text in langtexts], line_length)
+
+        columns = dict(
+            (name, [])
+            for name in (
+                "langtextnummer",
+                "zeilennummer_1",
+                "langtextzeile_1",
+                "zeilennummer_2",
+                "langtextzeile_2",
+            )
+        )
+        for (langtextnummer, text), lines in zip(langtexts, wrapped):
+            for index in range(0, len(lines), 2):
+                columns["langtextnummer"].append(langtextnummer)
+                columns["zeilennummer_1"].append(index + 1)
+                columns["langtextzeile_1"].append(lines[index])
+                has_second = index + 1 < len(lines)
+                columns["zeilennummer_2"].append(index + 2 if has_second else None)
+                columns["langtextzeile_2"].append(
+                    lines[index + 1] if has_second else None
+                )
+        columns["verarbeitungsmerker"] = [verarbeitungsmerker] * len(
+            columns["langtextnummer"]
+        )
+        return self.langtext_class.encode_columns(columns)
+
+    def staffelpreis_batch(
+        self,
+        tiers,
+        verarbeitungsmerker=None,
+        basismerker=Staffelpreiszeile.ORDER_QUANTITY,
+        preiskennzeichen=Staffelpreiszeile.LIST_PRICE,
+        batch_size=10000,
+        price_unit="euro",
+    ) -> Iterator[bytes]:
+        """
+        Yield the Staffelpreiszeile records of a tier table in one streaming
+        pass, encoding them column by column in batches.
+
+        The tiers are (artikelnummer, von_basis, preis) tuples or columns of
+        those names, sorted by artikelnummer and quantity. satznummer counts
+        the tiers of every article from 1 and bis_basis is the quantity of
+        the next tier minus one, empty for the last tier. Prices are
+        converted with to_cents and checked against the 8 digit limit per
+        batch. Invalid tiers raise a RowError with their index in tiers.
+
+        :param price_unit: The unit of all prices, "euro" or "cent".
+        """
+        if price_unit not in PRICE_UNITS:
+            raise ValueError("Unknown price unit %s" % price_unit)
+        constants = {
+            "verarbeitungsmerker": verarbeitungsmerker or self.verarbeitungsmerker,
+            "basismerker": basismerker,
+            "preiskennzeichen": preiskennzeichen,
+        }
+        if isinstance(tiers, Mapping) or hasattr(tiers, "to_pydict"):
+            if hasattr(tiers, "to_pydict"):
+                tiers = tiers.to_pydict()
+            tiers = zip(
+                *[
+                    column_values(tiers[name])
+                    for name in ("artikelnummer", "von_basis", "preis")
+                ]
+            )
+
+        names = ("artikelnummer", "satznummer", "von_basis", "bis_basis", "preis")
+        columns = dict((name, []) for name in names)
+        artikelnummern = columns["artikelnummer"]
+        satznummern = columns["satznummer"]
+        von = columns["von_basis"]
+        bis = columns["bis_basis"]
+        prices = columns["preis"]
+        # index of the first tier in columns
+        start = 0
+        for index, (artikelnummer, quantity, price) in enumerate(tiers):
+            if artikelnummern and artikelnummern[-1] == artikelnummer:
+                if quantity <= von[-1]:
+                    raise RowError(
+                        index, "von_basis", "Tiers are not sorted by quantity"
+                    )
+                bis[-1] = quantity - 1
+                satznummer = satznummern[-1] + 1
+            else:
+                if len(artikelnummern) > batch_size:
+                    # the last tier is kept until its bis_basis is known
+                    yield from self._staffelpreis_records(
+                        columns, start, len(artikelnummern) - 1, constants, price_unit
+                    )
+                    start = index - 1
+                satznummer = 1
+            artikelnummern.append(artikelnummer)
+            satznummern.append(satznummer)
+            von.append(quantity)
+            bis.append(None)
+            prices.append(price)
+
+        yield from self._staffelpreis_records(
+            columns, start, len(artikelnummern), constants, price_unit
+        )
+
+    def _staffelpreis_records(
+        self, columns, start, size, constants, price_unit
+    ) -> Iterator[bytes]:
+        """
+        Encode the first size tiers of columns, with constants for the other
+        fields, and remove them.
+        """
+        batch = dict((name, values[:size]) for name, values in columns.items())
+        for values in columns.values():
+            del values[:size]
+        if not size:
+            return iter(())
+
+        try:
+            prices = [to_cents(price, price_unit) for price in batch["preis"]]
+        except (ArithmeticError, ValueError):
+            for index, price in enumerate(batch["preis"]):
+                try:
+                    to_cents(price, price_unit)
+                except (ArithmeticError, ValueError) as e:
+                    raise RowError(
+                        start + index, "preis", "Invalid price %r" % (price,)
+                    ) from e
+        batch["preis"] = prices
+        limit = 10 ** self.staffelpreis_class.base_fields["preis"].max_length
+        if max(prices) >= limit or min(prices) < 0:
+            for index, price in enumerate(prices):
+                if not 0 <= price < limit:
+                    raise RowError(
+                        start + index, "preis", "Price %d cents out of range" % price
+                    )
+
+        for name, value in constants.items():
+            batch[name] = [value] * size
+        try:
+            return self.staffelpreis_class.encode_columns(batch)
+        except RowError as e:
+            raise RowError(start + e.index, e.field_name, e.message) from e
+
+    def textkennzeichen(self, values, has_langtext) -> str:
+        row = self.artikel_class
+        text = row.TEXT_KURZ1_KURZ2_LANG if has_langtext else row.TEXT_KURZ1_KURZ2
+        if values.get("kurztext_2"):
+            return text + row.TEXT_HAS_KURZ2_TRUE
+        return text + row.TEXT_HAS_KURZ2_FALSE
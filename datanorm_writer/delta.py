@@ -0,0 +1,127 @@
+import hashlib
+import os
+import sqlite3
+from typing import Iterator
+
+from .composer import ProductComposer
+
+
+def set_verarbeitungsmerker(record: bytes, verarbeitungsmerker: bytes) -> bytes:
+    """
+    Replace the verarbeitungsmerker of an encoded record, which always is the
+    single character after the satzartenkennzeichen.
+    """
+    if record[1:2] != b";":
+        raise ValueError("Unexpected record layout %r" % record[:3])
+    return record[:2] + verarbeitungsmerker + record[3:]
+
+
+class DeltaExporter(object):
+    """
+    Export only the articles that changed since the previous run.
+
+    The content hash of every article's records is kept in a sqlite
+    fingerprint store keyed by artikelnummer. Products are compared against
+    the store one by one, new articles are written with verarbeitungsmerker N,
+    changed ones with A, and articles missing from the input are deleted with
+    L records. The fingerprints of the current run are collected in a new
+    store, which replaces the previous one when commit is called, so an
+    aborted export leaves the previous state untouched.
+
+    Products should carry a stable langtextnummer, the running numbers the
+    composer assigns otherwise depend on the order of the input.
+    """
+
+    batch_size = 10000
+
+    def __init__(self, path, composer=None):
+        self.path = path
+        self.new_path = path + ".new"
+        self.composer = composer or ProductComposer()
+        self.stats = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+
+    @staticmethod
+    def digest(records) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        for record in records:
+            digest.update(record)
+            digest.update(b"\n")
+        return digest.digest()
+
+    def connect(self):
+        if os.path.exists(self.new_path):
+            os.remove(self.new_path)
+
+        connection = sqlite3.connect(self.new_path)
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute(
+            "CREATE TABLE fingerprints "
+            "(artikelnummer TEXT PRIMARY KEY, digest BLOB NOT NULL) WITHOUT ROWID"
+        )
+        if os.path.exists(self.path):
+            connection.execute("ATTACH DATABASE ? AS previous", (self.path,))
+        else:
+            connection.execute("ATTACH DATABASE ':memory:' AS previous")
+            connection.execute(
+                "CREATE TABLE previous.fingerprints "
+                "(artikelnummer TEXT PRIMARY KEY, digest BLOB NOT NULL)"
+            )
+        return connection
+
+    def export(self, products) -> Iterator[bytes]:
+        """
+        Yield the encoded N, A and L records for a stream of products.
+        """
+        connection = self.connect()
+        try:
+            yield from self._export(connection, products)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _export(self, connection, products):
+        lookup = "SELECT digest FROM previous.fingerprints WHERE artikelnummer = ?"
+        insert = "INSERT OR REPLACE INTO main.fingerprints VALUES (?, ?)"
+
+        batch = []
+        for product in products:
+            artikelnummer = str(product["artikelnummer"])
+            records = list(self.composer.compose(product, "N"))
+            digest = self.digest(records)
+
+            previous = connection.execute(lookup, (artikelnummer,)).fetchone()
+            if previous is None:
+                self.stats["new"] += 1
+                yield from records
+            elif previous[0] != digest:
+                self.stats["changed"] += 1
+                for record in records:
+                    yield set_verarbeitungsmerker(record, b"A")
+            else:
+                self.stats["unchanged"] += 1
+
+            batch.append((artikelnummer, digest))
+            if len(batch) >= self.batch_size:
+                connection.executemany(insert, batch)
+                batch = []
+        connection.executemany(insert, batch)
+
+        deleted = connection.execute(
+            "SELECT artikelnummer FROM previous.fingerprints WHERE artikelnummer "
+            "NOT IN (SELECT artikelnummer FROM main.fingerprints)"
+        )
+        for (artikelnummer,) in deleted:
+            self.stats["deleted"] += 1
+            yield from self.composer.compose_deletion(artikelnummer)
+
+    def commit(self):
+        """
+        Make the fingerprints of the last export the previous state.
+        """
+        with open(self.new_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(self.new_path, self.path)
+
+    def rollback(self):
+        if os.path.exists(self.new_path):
+            os.remove(self.new_path)
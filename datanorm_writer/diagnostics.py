@@ -0,0 +1,140 @@
+import contextlib
+import contextvars
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_active = contextvars.ContextVar("datanorm_diagnostics", default=None)
+
+
+class Diagnostics(object):
+    """
+    Collect invalid characters found while encoding.
+
+    Values with characters missing from the charset are counted per field
+    and per character, and the artikelnummer of the first max_samples
+    offending rows is kept, instead of logging every single value. Logging
+    every value is opt-in with log_records.
+
+    A collector is used while it is active (see activate and the
+    diagnostics argument of DatanormWriter) or when it is set as the
+    diagnostics attribute of a row class.
+    """
+
+    def __init__(self, max_samples=20, log_records=False):
+        self.max_samples = max_samples
+        self.log_records = log_records
+        self.invalid_values = 0
+        self.fields = Counter()
+        self.characters = Counter()
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return self.invalid_values > 0
+
+    @contextlib.contextmanager
+    def activate(self):
+        """
+        Report invalid characters to this collector inside the with block,
+        in the current thread or asyncio task.
+        """
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def add(self, field_name, characters, artikelnummer=None):
+        """
+        Record a value of field_name containing the invalid characters.
+        """
+        if self.log_records:
+            log_invalid(characters, field_name, artikelnummer)
+        with self._lock:
+            self.invalid_values += 1
+            self.fields[field_name] += 1
+            self.characters.update(characters)
+            if (
+                artikelnummer
+                and len(self.samples) < self.max_samples
+                and artikelnummer not in self.samples
+            ):
+                self.samples.append(artikelnummer)
+
+    def merge(self, other: "Diagnostics"):
+        """
+        Add the counts of another collector, e.g. one from a worker process.
+        """
+        with self._lock:
+            self.invalid_values += other.invalid_values
+            self.fields.update(other.fields)
+            self.characters.update(other.characters)
+            for artikelnummer in other.samples:
+                if len(self.samples) >= self.max_samples:
+                    break
+                if artikelnummer not in self.samples:
+                    self.samples.append(artikelnummer)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "invalid_values": self.invalid_values,
+                "fields": dict(self.fields.most_common()),
+                "characters": dict(self.characters.most_common()),
+                "samples": list(self.samples),
+            }
+
+    def log_summary(self, level=logging.WARNING):
+        if not self:
+            return
+        summary = self.summary()
+        logger.log(
+            level,
+            "Removed invalid characters from %d values. Fields: %s. Characters: %s. "
+            "Articles: %s",
+            summary["invalid_values"],
+            ", ".join("%s (%d)" % item for item in summary["fields"].items()),
+            ", ".join("%r (%d)" % item for item in summary["characters"].items()),
+            ", ".join(summary["samples"]) or "-",
+        )
+
+
+def log_invalid(characters, field_name=None, artikelnummer=None):
+    error = "Invalid characters %s in string" % ", ".join(sorted(characters))
+    if field_name:
+        error += " translating field {}".format(field_name)
+    if artikelnummer:
+        error += " of article {}".format(artikelnummer)
+    logger.error(error)
+
+
+def report_invalid(characters, field_name=None, values=None, row_class=None):
+    """
+    Pass invalid characters to the active collector, or the one of the row
+    class. Without a collector they are only logged at debug level.
+    """
+    diagnostics = _active.get()
+    if diagnostics is None and row_class is not None:
+        diagnostics = row_class.diagnostics
+    artikelnummer = values.get("artikelnummer") if values else None
+
+    if diagnostics is not None:
+        diagnostics.add(field_name, characters, artikelnummer and str(artikelnummer))
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Invalid characters %s in field %s",
+            ", ".join(sorted(characters)),
+            field_name,
+        )
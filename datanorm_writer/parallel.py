@@ -0,0 +1,143 @@
+import itertools
+import os
+from collections import deque
+
+from .base import RowError
+from .diagnostics import Diagnostics
+
+
+def encode_chunk(
+    encode, start, items, line_separator=b"\r\n", collect=False, skip_invalid=False
+):
+    """
+    Encode a chunk of items into one block of records.
+
+    :param encode: A picklable callable turning an item into a record or a
+        list of records.
+    :param start: Index of the first item in the whole input, used for errors.
+    :param collect: Collect invalid characters in a new Diagnostics, which
+        is returned with the data, as executors don't share the caller's
+        collector.
+    :param skip_invalid: Skip invalid items and return their errors, only
+        used together with collect.
+    :return: The encoded records, each followed by line_separator, or a
+        (data, diagnostics, errors) tuple when collecting.
+    """
+    if collect:
+        diagnostics = Diagnostics()
+        errors = [] if skip_invalid else None
+        with diagnostics.activate():
+            data = _encode_chunk(encode, start, items, line_separator, errors)
+        return data, diagnostics, errors or []
+    return _encode_chunk(encode, start, items, line_separator)
+
+
+def _encode_chunk(encode, start, items, line_separator, errors=None):
+    records = []
+    for offset, item in enumerate(items):
+        try:
+            record = encode(item)
+        except RowError as e:
+            if errors is None:
+                raise
+            errors.append(e)
+        except ValueError as e:
+            error = RowError.from_error(start + offset, None, e)
+            if errors is None:
+                raise error from e
+            errors.append(error)
+        else:
+            if isinstance(record, list):
+                records.extend(record)
+            else:
+                records.append(record)
+    records.append(b"")
+    return line_separator.join(records)
+
+
+def encode_parallel(
+    items,
+    encode,
+    executor=None,
+    max_workers=None,
+    chunk_size=1000,
+    max_pending=None,
+    line_separator=b"\r\n",
+    diagnostics=None,
+    errors=None,
+    threads=False,
+):
+    """
+    Encode items in chunks on an executor and yield (data, count) tuples for
+    every chunk in input order.
+
+    At most max_pending chunks are in flight, so the input is consumed lazily
+    and memory use does not depend on the input size. Without an executor a
+    ProcessPoolExecutor, or a ThreadPoolExecutor if threads is true, is
+    created and shut down afterwards. Threads avoid pickling rows and
+    records, but only scale on free-threaded Python builds. Invalid items
+    raise a RowError with the index of the item in the whole input, unless
+    an errors list is given, which collects the errors while invalid items
+    are skipped. Invalid characters found by the workers are merged into
+    diagnostics.
+    """
+    own_executor = executor is None
+    if own_executor and threads:
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers)
+    elif own_executor:
+        # imported here, it pulls in multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers)
+    if max_pending is None:
+        max_pending = 2 * (max_workers or os.cpu_count() or 1)
+    if errors is not None and diagnostics is None:
+        diagnostics = Diagnostics()
+
+    items = iter(items)
+    pending = deque()
+    try:
+        start = 0
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if not chunk:
+                break
+            future = executor.submit(
+                encode_chunk,
+                encode,
+                start,
+                chunk,
+                line_separator,
+                diagnostics is not None,
+                errors is not None,
+            )
+            pending.append((future, len(chunk)))
+            start += len(chunk)
+            if len(pending) >= max_pending:
+                future, count = pending.popleft()
+                yield result(future, count, diagnostics, errors)
+
+        while pending:
+            future, count = pending.popleft()
+            yield result(future, count, diagnostics, errors)
+    finally:
+        for future, count in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+
+def result(future, count, diagnostics=None, errors=None):
+    """
+    Return the (data, count) of a finished encode_chunk call, merging what it
+    collected into diagnostics and errors.
+    """
+    if diagnostics is None:
+        return future.result(), count
+    data, chunk_diagnostics, chunk_errors = future.result()
+    diagnostics.merge(chunk_diagnostics)
+    if errors is not None:
+        errors.extend(chunk_errors)
+    return data, count - len(chunk_errors)
@@ -0,0 +1,144 @@
+import mmap
+import os
+from typing import Iterator
+
+from .rows import (
+    Artikelzeile,
+    Artikelzeile2,
+    Langtextzeile,
+    Staffelpreiszeile,
+    VorlaufZeile,
+)
+
+
+class DatanormReader(object):
+    """
+    Read datanorm files lazily through a memory map.
+
+    Records are dispatched on their satzartenkennzeichen to the row classes
+    and parsed with RowBase.parse. build_index creates an offset index keyed
+    by artikelnummer, so single articles can be looked up without reading
+    the whole file into memory.
+
+    :param file: A path or a binary file object with a file descriptor.
+    """
+
+    line_separator = b"\r\n"
+    row_classes = (
+        VorlaufZeile,
+        Artikelzeile,
+        Artikelzeile2,
+        Langtextzeile,
+        Staffelpreiszeile,
+    )
+
+    def __init__(self, file, row_classes=None, errors="strict"):
+        if isinstance(file, (str, bytes, os.PathLike)):
+            self._file = open(file, "rb")
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+
+        self.errors = errors
+        self.kinds = dict(
+            (
+                row_class.base_fields["satzartenkennzeichen"].static_value.encode(),
+                row_class,
+            )
+            for row_class in (row_classes or self.row_classes)
+        )
+        self.index = None
+
+        if os.fstat(self._file.fileno()).st_size:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        for offset, record in self.records():
+            yield self.parse(record)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._owns_file:
+            self._file.close()
+
+    def records(self, offset=0) -> Iterator:
+        """
+        Yield (offset, record) tuples of the raw records starting at offset.
+        """
+        data = self.data
+        separator = self.line_separator
+        size = len(data)
+        while offset < size:
+            end = data.find(separator, offset)
+            if end == -1:
+                end = size
+            yield offset, data[offset:end]
+            offset = end + len(separator)
+
+    def row_class(self, record: bytes):
+        try:
+            return self.kinds[record[:1]]
+        except KeyError:
+            raise ValueError("Unknown record type %r" % record[:1]) from None
+
+    def parse(self, record: bytes):
+        return self.row_class(record).parse(record, self.errors)
+
+    def read_at(self, offset):
+        """
+        Parse the record starting at offset.
+        """
+        for offset, record in self.records(offset):
+            return self.parse(record)
+        raise IndexError("No record at offset %d" % offset)
+
+    def build_index(self):
+        """
+        Map satzartenkennzeichen plus artikelnummer to the offset of the first
+        record of that kind, for all record kinds with an artikelnummer.
+        """
+        positions = {}
+        for kind, row_class in self.kinds.items():
+            fields = list(row_class.base_fields)
+            if "artikelnummer" in fields and row_class.separator:
+                positions[kind] = (row_class.separator, fields.index("artikelnummer"))
+
+        index = {}
+        for offset, record in self.records():
+            position = positions.get(record[:1])
+            if position is None:
+                continue
+            separator, field_index = position
+            parts = record.split(separator, field_index + 1)
+            if len(parts) > field_index:
+                index.setdefault(record[:1] + parts[field_index], offset)
+
+        self.index = index
+        return index
+
+    def get(self, artikelnummer, satzartenkennzeichen="A"):
+        """
+        Look up the first record of a kind for an artikelnummer, building the
+        index on first use. Returns None for unknown articles.
+        """
+        if self.index is None:
+            self.build_index()
+
+        row_class = self.kinds[satzartenkennzeichen.encode()]
+        key = satzartenkennzeichen.encode() + row_class.encoder().codec.encode(
+            artikelnummer
+        )
+        offset = self.index.get(key)
+        if offset is None:
+            return None
+        return self.read_at(offset)
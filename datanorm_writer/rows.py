@@ -21,18 +21,13 @@ class VorlaufZeile(RowBase):
     waehrungskennzeichen = StaticField("EUR")
 
     separator = b""
-
-    @property
-    def output(self) -> bytes:
-        output = super().output
-        # has to be fixed size of 128 to be recognized as datanorm 4
-        assert len(output) == 128
-        return output
+    # has to be fixed size of 128 to be recognized as datanorm 4
+    record_length = 128
 
 
 class Artikelzeile(RowBase):
     satzartenkennzeichen = StaticField("A")
-    verarbeitungsmerker = StringField(values="AN", length=1)
+    verarbeitungsmerker = StringField(values="ANL", length=1)
     artikelnummer = StringField(max_length=15)
 
     TEXT_KURZ1_KURZ2 = "0"
@@ -48,7 +43,7 @@ class Artikelzeile(RowBase):
 
     # is actually an integer field but with fixed choices
     textkennzeichen = StringField(
-        values=(
+        values=[
             "".join(x)
             for x in itertools.product(
                 [
@@ -62,7 +57,7 @@ class Artikelzeile(RowBase):
                 ],
                 [TEXT_HAS_KURZ2_TRUE, TEXT_HAS_KURZ2_FALSE],
             )
-        ),
+        ],
         length=2,
     )
 
@@ -72,7 +67,7 @@ class Artikelzeile(RowBase):
     PREIS_LISTENPREIS = 1
     PREIS_NETTOPREIS = 2
     preiskennzeichen = IntegerField(
-        values=(PREIS_LISTENPREIS, PREIS_NETTOPREIS,), length=1
+        values=(PREIS_LISTENPREIS, PREIS_NETTOPREIS), length=1
     )
 
     PRICE_BY_1_UNIT = 0
@@ -104,7 +99,7 @@ class Artikelzeile(RowBase):
 
 class Artikelzeile2(RowBase):
     satzartenkennzeichen = StaticField("B")
-    verarbeitungsmerker = StringField(values="AN", length=1)
+    verarbeitungsmerker = StringField(values="ANL", length=1)
 
     artikelnummer = StringField(max_length=15)
 
@@ -0,0 +1,202 @@
+import heapq
+import itertools
+import shutil
+import struct
+import tempfile
+from typing import Iterator
+
+from .codec import get_codec
+from .rows import Artikelzeile
+
+# encoded record and key, each prefixed with its length
+entry_header = struct.Struct(">II")
+sequence_number = struct.Struct(">Q")
+
+
+class ExternalSorter(object):
+    """
+    Group encoded records per article with a fixed memory budget.
+
+    Records are added with the artikelnummer they belong to, in any order.
+    Whenever the buffered records exceed memory_limit bytes they are sorted
+    and spilled to a temporary run file, iterating the sorter merges the runs
+    and yields the records ordered by artikelnummer, then by record kind in
+    the order of kinds (A, B, T, Z), then in the order they were added.
+
+    Artikelnummern are compared by their encoded bytes, so numeric article
+    numbers are ordered like strings.
+
+    :param memory_limit: Approximate bytes of records kept in memory.
+    :param max_runs: Maximum number of run files merged at once, more runs
+        are merged in several passes.
+    :param directory: Directory for the run files, defaults to the system
+        temporary directory.
+    :param charset: The charset used to encode artikelnummern given as str,
+        with the transliterations of Artikelzeile.
+    """
+
+    kinds = b"ABTZ"
+    # read and write buffer per run file
+    buffer_size = 256 * 1024
+    # approximate memory used by a buffered entry besides its bytes
+    entry_overhead = 120
+
+    def __init__(
+        self, memory_limit=64 * 1024 * 1024, max_runs=64, directory=None, charset=None
+    ):
+        if max_runs < 2:
+            raise ValueError("max_runs must be at least 2")
+
+        self.memory_limit = memory_limit
+        self.max_runs = max_runs
+        self.codec = get_codec(
+            charset or Artikelzeile.charset, Artikelzeile.transliterations
+        )
+        self.ranks = dict(
+            (bytes((kind,)), rank) for rank, kind in enumerate(self.kinds)
+        )
+
+        self.records_added = 0
+        self.runs_written = 0
+
+        self._directory = tempfile.mkdtemp(prefix="datanorm-sort-", dir=directory)
+        self._runs = []
+        self._buffer = []
+        self._buffer_size = 0
+        self._sequence = itertools.count()
+        self._merged = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self) -> Iterator[bytes]:
+        for key, record in self.merge():
+            yield record
+
+    @property
+    def stats(self):
+        return {"records": self.records_added, "runs": self.runs_written}
+
+    def key(self, artikelnummer, record: bytes) -> bytes:
+        """
+        Build the sort key of a record: the encoded artikelnummer, a zero
+        byte, the rank of the record kind and a sequence number.
+        """
+        if isinstance(artikelnummer, str):
+            artikelnummer = self.codec.encode(artikelnummer)
+        rank = self.ranks.get(record[:1], len(self.kinds))
+        return (
+            artikelnummer
+            + b"\x00"
+            + bytes((rank,))
+            + sequence_number.pack(next(self._sequence))
+        )
+
+    def add(self, artikelnummer, record: bytes):
+        """
+        Add an encoded record, without line separator, belonging to the
+        article artikelnummer, which is given as str or encoded bytes.
+        """
+        if self._merged:
+            raise ValueError("Records can't be added after merging")
+
+        key = self.key(artikelnummer, record)
+        self._buffer.append((key, record))
+        self._buffer_size += len(key) + len(record) + self.entry_overhead
+        self.records_added += 1
+        if self._buffer_size >= self.memory_limit:
+            self.spill()
+
+    def add_records(self, artikelnummer, records):
+        for record in records:
+            self.add(artikelnummer, record)
+
+    def add_record(self, record: bytes):
+        """
+        Add an A, B or Z record, which carry the artikelnummer in their
+        third field. T records belong to the articles referencing their
+        langtextnummer and have to be added with add.
+        """
+        parts = record.split(b";", 3)
+        if len(parts) < 4 or record[:1] not in (b"A", b"B", b"Z"):
+            raise ValueError("Record %r has no artikelnummer" % record[:3])
+        self.add(parts[2], record)
+
+    def spill(self):
+        """
+        Sort the buffered records and write them to a new run file.
+        """
+        if not self._buffer:
+            return
+        self._buffer.sort()
+        self._runs.append(self._write_run(self._buffer))
+        self._buffer = []
+        self._buffer_size = 0
+
+    def merge(self) -> Iterator:
+        """
+        Yield (key, record) tuples of all records in order. The sorter can
+        be merged only once.
+        """
+        if self._merged:
+            raise ValueError("Records have already been merged")
+        self._merged = True
+
+        if not self._runs:
+            # everything fit into memory
+            self._buffer.sort()
+            buffer, self._buffer = self._buffer, []
+            yield from buffer
+            return
+
+        self.spill()
+        runs = self._runs
+        while len(runs) > self.max_runs:
+            runs = [
+                self._write_run(self._merge_runs(runs[start : start + self.max_runs]))
+                for start in range(0, len(runs), self.max_runs)
+            ]
+        self._runs = runs
+        yield from self._merge_runs(runs)
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = []
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _write_run(self, entries):
+        run = tempfile.TemporaryFile(dir=self._directory, buffering=self.buffer_size)
+        write = run.write
+        pack = entry_header.pack
+        for key, record in entries:
+            write(pack(len(key), len(record)))
+            write(key)
+            write(record)
+        run.flush()
+        self.runs_written += 1
+        return run
+
+    def _merge_runs(self, runs) -> Iterator:
+        entries = heapq.merge(*[self._read_run(run) for run in runs])
+        for entry in entries:
+            yield entry
+        for run in runs:
+            run.close()
+
+    @staticmethod
+    def _read_run(run) -> Iterator:
+        run.seek(0)
+        read = run.read
+        unpack = entry_header.unpack
+        size = entry_header.size
+        while True:
+            header = read(size)
+            if not header:
+                return
+            key_size, record_size = unpack(header)
+            yield read(key_size), read(record_size)
@@ -0,0 +1,175 @@
+import queue
+import threading
+import zipfile
+
+from .writer import DatanormWriter
+
+
+class BackgroundZipStream(object):
+    """
+    A write only binary stream into members of a zip archive.
+
+    Data is handed to a background thread through a bounded queue, the
+    thread does the deflate compression (zlib releases the GIL) and writes
+    the archive, so compression overlaps with encoding.
+    """
+
+    def __init__(
+        self, file, compression=zipfile.ZIP_DEFLATED, compresslevel=None, max_pending=8
+    ):
+        self.archive = zipfile.ZipFile(
+            file, "w", compression=compression, compresslevel=compresslevel
+        )
+        self.error = None
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def open_member(self, name):
+        self._put(("open", name))
+
+    def write(self, data):
+        # the data may be a view of a buffer that is reused right away
+        data = bytes(data)
+        self._put(("write", data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(("close", None))
+            self._thread.join()
+        self._raise_error()
+
+    def _put(self, item):
+        self._raise_error()
+        self._queue.put(item)
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        member = None
+        while True:
+            operation, argument = self._queue.get()
+            try:
+                if self.error is not None:
+                    # keep draining the queue, so writers don't block
+                    pass
+                elif operation == "open":
+                    if member is not None:
+                        member.close()
+                    member = self.archive.open(argument, "w", force_zip64=True)
+                elif operation == "write":
+                    member.write(argument)
+            except Exception as e:
+                self.error = e
+
+            if operation == "close":
+                try:
+                    if member is not None:
+                        member.close()
+                    self.archive.close()
+                except Exception as e:
+                    self.error = self.error or e
+                return
+
+
+class MultiVolumeWriter(DatanormWriter):
+    """
+    Write datanorm volumes DATANORM.001, DATANORM.002, ... into a zip archive.
+
+    A new volume is started before a record would make the current one
+    exceed max_bytes, or when it holds max_records rows besides the header.
+    Every volume starts with the header. Compression runs in a background
+    thread, see BackgroundZipStream.
+
+    :param file: A path or a binary file object for the zip archive.
+    """
+
+    member_name = "DATANORM.{:03d}"
+
+    def __init__(
+        self,
+        file,
+        header=None,
+        row_class=None,
+        max_bytes=None,
+        max_records=None,
+        buffer_size=64 * 1024,
+        compresslevel=None,
+        diagnostics=None,
+    ):
+        super(MultiVolumeWriter, self).__init__(
+            BackgroundZipStream(file, compresslevel=compresslevel),
+            header=header,
+            row_class=row_class,
+            buffer_size=buffer_size,
+            diagnostics=diagnostics,
+        )
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.volumes = 0
+        self._volume_bytes = 0
+        self._volume_records = 0
+
+    @property
+    def stats(self):
+        stats = super(MultiVolumeWriter, self).stats
+        stats["volumes"] = self.volumes
+        return stats
+
+    def close(self):
+        stats = super(MultiVolumeWriter, self).close()
+        self.stream.close()
+        return stats
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            super(MultiVolumeWriter, self).__exit__(exc_type, exc_value, traceback)
+        finally:
+            if exc_type is not None:
+                # terminate the archive and stop the compression thread
+                self.stream.close()
+
+    def _next_volume(self):
+        self._flush_buffer()
+        self.volumes += 1
+        self.stream.open_member(self.member_name.format(self.volumes))
+        self._volume_bytes = 0
+        self._volume_records = 0
+        self._write_volume_record(self._header_record, header=True)
+
+    def _write_header_record(self, record: bytes):
+        # the header starts the first volume
+        self._next_volume()
+
+    def _write_record(self, record: bytes):
+        if self._volume_records > 1 and (
+            (self.max_records and self._volume_records > self.max_records)
+            or (
+                self.max_bytes
+                and self._volume_bytes + len(record) + len(self.line_separator)
+                > self.max_bytes
+            )
+        ):
+            self._next_volume()
+        self._write_volume_record(record)
+
+    def _write_volume_record(self, record: bytes, header=False):
+        if header:
+            super(MultiVolumeWriter, self)._write_header_record(record)
+        else:
+            super(MultiVolumeWriter, self)._write_record(record)
+        self._volume_bytes += len(record) + len(self.line_separator)
+        self._volume_records += 1
+
+    def _write_block(self, data: bytes, count):
+        # split blocks from parallel encoding, volumes end at record boundaries
+        records = data.split(self.line_separator)
+        records.pop()
+        for record in records:
+            self._write_record(record)
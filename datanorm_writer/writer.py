@@ -0,0 +1,540 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import zlib
+from collections.abc import Mapping
+
+from .base import CompactRecord, RowBase, RowError, column_values
+from .diagnostics import Diagnostics
+from .parallel import encode_parallel
+from .rows import VorlaufZeile
+
+logger = logging.getLogger(__name__)
+
+
+def encode_row(row, row_class=None, validation=None) -> bytes:
+    """
+    Encode a RowBase instance, a compact record or a mapping of values for
+    row_class.
+
+    :param validation: The validation mode, defaults to the one of the row
+        class, see RowBase.validation.
+    """
+    if isinstance(row, RowBase):
+        return row.encode(row.values, validation)
+    if isinstance(row, CompactRecord):
+        return row.row_class.encode_tuple(row, validation)
+    if isinstance(row, Mapping):
+        if row_class is None:
+            raise ValueError("row_class is required to write mappings")
+        return row_class.encode(row, validation)
+    raise TypeError("Can't write row of type %s" % type(row).__name__)
+
+
+def collects_errors(validation, row_class=None) -> bool:
+    """
+    Whether invalid rows are skipped and collected, for the validation mode
+    of a writer and the row class of a row.
+    """
+    if validation is None:
+        validation = getattr(row_class, "validation", None)
+    return validation == "collect"
+
+
+def read_checkpoint(path):
+    """
+    Return the state saved by write_checkpoint, or None if there is none.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    """
+    Atomically replace the checkpoint at path with state, a JSON object.
+    """
+    temporary = "%s.tmp" % path
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class DatanormWriter(object):
+    """
+    Stream datanorm records into a binary file object.
+
+    Records are encoded one at a time and collected in a preallocated output
+    buffer that is written to the stream whenever it is full, so memory usage
+    does not depend on the number of rows written.
+
+    :param stream: A binary file object opened for writing.
+    :param header: A VorlaufZeile or a mapping of its values. It is written
+        before the first row unless write_header is called explicitly.
+    :param row_class: The RowBase subclass used for rows given as mappings.
+    :param buffer_size: Size of the output buffer in bytes.
+    :param diagnostics: A Diagnostics collector for invalid characters,
+        a new one is created by default. Its summary is logged on close.
+    :param validation: "strict", "trusted" or "collect", overriding the
+        validation mode of the row classes, see RowBase.validation. When
+        collecting, invalid rows are skipped and their RowErrors, with the
+        index of the row among all rows given to the writer, are kept in
+        the errors list.
+    :param checkpoint: Path of a JSON file recording the input position,
+        output offset, counters and a crc32 of the output every
+        checkpoint_interval input rows and on close.
+    :param resume: Continue from the checkpoint: the output, opened with
+        "r+b", is checked against the crc32 and truncated to the recorded
+        offset, and as many input rows as were read before are skipped, so
+        the same input has to be given again. Without a checkpoint file the
+        export starts from scratch. Rows, rows in columns and already
+        encoded records given to the write methods all count as input.
+    """
+
+    line_separator = b"\r\n"
+    header_class = VorlaufZeile
+
+    def __init__(
+        self,
+        stream,
+        header=None,
+        row_class=None,
+        buffer_size=64 * 1024,
+        diagnostics=None,
+        validation=None,
+        checkpoint=None,
+        checkpoint_interval=10000,
+        resume=False,
+    ):
+        if buffer_size <= 0:
+            raise ValueError("buffer_size must be positive")
+        if resume and checkpoint is None:
+            raise ValueError("resume requires a checkpoint")
+
+        self.stream = stream
+        self.header = header
+        self.row_class = row_class
+        self.buffer_size = buffer_size
+        self.diagnostics = Diagnostics() if diagnostics is None else diagnostics
+        self.validation = validation
+        self.errors = []
+
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.rows_read = 0
+
+        self._buffer = bytearray(buffer_size)
+        # reused for the blocks of write_batch
+        self._batch_buffer = bytearray()
+        self._position = 0
+        self._header_record = None
+        self._header_written = False
+        self._closed = False
+
+        self.checkpoint_path = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        # crc32 of everything written to the stream, kept for checkpoints
+        self._crc = 0 if checkpoint is not None else None
+        self._next_checkpoint = checkpoint_interval
+        # input rows read before resuming, to be skipped
+        self._skip = 0
+        if resume:
+            self._resume()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.flush()
+
+    @property
+    def stats(self):
+        return {"rows": self.rows_written, "bytes": self.bytes_written}
+
+    def write_header(self, header=None):
+        if self._header_written:
+            raise ValueError("Header has already been written")
+
+        header = self.header if header is None else header
+        if header is None:
+            raise ValueError("No header to write")
+
+        self._header_written = True
+        with self.diagnostics.activate():
+            self._header_record = encode_row(header, self.header_class)
+        self._write_header_record(self._header_record)
+
+    def write_row(self, row, row_class=None):
+        """
+        Encode and write a single row.
+
+        :param row: A RowBase instance, a compact RowBase.Record or a
+            mapping of field values.
+        :param row_class: The row class for mappings, defaults to the
+            row_class given to the writer.
+        """
+        if self._skip:
+            self._skip -= 1
+            return
+        self._ensure_header()
+        with self.diagnostics.activate():
+            record = self._encode(row, row_class or self.row_class)
+        if record is not None:
+            self._write_record(record)
+        self._checkpoint_if_due()
+
+    def write_rows(self, rows, row_class=None, encode=None):
+        """
+        Encode and write rows from any iterable, consuming it lazily.
+
+        :param encode: A callable turning a row into a record, or a list of
+            records, used instead of encoding rows of row_class.
+        """
+        rows = self._skip_completed(rows)
+        self._ensure_header()
+        row_class = row_class or self.row_class
+        checkpoint = self.checkpoint_path is not None
+        with self.diagnostics.activate():
+            for row in rows:
+                record = self._encode(row, row_class, encode)
+                if isinstance(record, list):
+                    for part in record:
+                        self._write_record(part)
+                elif record is not None:
+                    self._write_record(record)
+                if checkpoint:
+                    self._checkpoint_if_due()
+
+    def write_rows_parallel(
+        self,
+        rows,
+        row_class=None,
+        executor=None,
+        max_workers=None,
+        chunk_size=1000,
+        encode=None,
+        threads=False,
+    ):
+        """
+        Encode rows in chunks on an executor and write them in input order.
+
+        Rows must be picklable for process pools, mappings of values are the
+        cheapest to send. Without an executor a ProcessPoolExecutor with
+        max_workers processes is used, or a ThreadPoolExecutor if threads
+        is true, which scales on free-threaded Python builds. Invalid rows raise a RowError with the
+        index of the row in the input, or are collected in errors.
+
+        :param encode: A picklable callable turning a row into a record, or
+            a list of records, used instead of encoding rows of row_class.
+        """
+        rows = self._skip_completed(rows)
+        self._ensure_header()
+        row_class = row_class or self.row_class
+        # rows of row_class are encoded into exactly one record each
+        count_records = encode is not None
+        if encode is None:
+            encode = functools.partial(
+                encode_row, row_class=row_class, validation=self.validation
+            )
+        errors = [] if collects_errors(self.validation, row_class) else None
+        start = self.rows_read
+        for data, count in encode_parallel(
+            rows,
+            encode,
+            executor=executor,
+            max_workers=max_workers,
+            chunk_size=chunk_size,
+            line_separator=self.line_separator,
+            diagnostics=self.diagnostics,
+            errors=errors,
+            threads=threads,
+        ):
+            if count_records:
+                self._write_block(data, data.count(self.line_separator))
+            else:
+                self._write_block(data, count)
+            self.rows_read += count
+            for error in errors or ():
+                self.rows_read += 1
+                self.errors.append(
+                    RowError(start + error.index, error.field_name, error.message)
+                )
+            if errors:
+                del errors[:]
+            self._checkpoint_if_due()
+
+    def write_batch(self, rows, row_class=None):
+        """
+        Encode a batch of mappings into one block and write it at once.
+        Fixed width rows are packed into a buffer reused across batches.
+        When collecting errors the rows are written one by one, so that
+        every invalid row is collected.
+        """
+        row_class = row_class or self.row_class
+        if row_class is None:
+            raise ValueError("row_class is required to write batches")
+        if collects_errors(self.validation, row_class):
+            self.write_rows(rows, row_class)
+            return
+
+        rows = list(self._skip_completed(rows))
+        self._ensure_header()
+        encoder = row_class.encoder(self.validation)
+        try:
+            with self.diagnostics.activate():
+                block = encoder.encode_many(
+                    rows, self.line_separator, self._batch_buffer
+                )
+        except RowError as e:
+            raise RowError(self.rows_read + e.index, e.field_name, e.message) from e
+        self._write_block(block, len(rows))
+        self.rows_read += len(rows)
+        self._checkpoint_if_due()
+
+    def write_columns(self, columns, row_class=None):
+        """
+        Encode and write rows given as columns, see RowBase.encode_columns.
+        """
+        row_class = row_class or self.row_class
+        if row_class is None:
+            raise ValueError("row_class is required to write columns")
+        if self._skip:
+            columns = self._skip_columns(columns)
+        collect = collects_errors(self.validation, row_class)
+        # in collect mode an invalid row makes every row be encoded again,
+        # so invalid characters are only kept once all columns encoded
+        diagnostics = self.diagnostics
+        if collect:
+            diagnostics = Diagnostics(diagnostics.max_samples, diagnostics.log_records)
+        try:
+            with diagnostics.activate():
+                records = row_class.encode_columns(columns, self.validation)
+        except RowError as e:
+            if not collect:
+                raise RowError(self.rows_read + e.index, e.field_name, e.message) from e
+            # find all invalid rows, not only the first one
+            if hasattr(columns, "to_pydict"):
+                columns = columns.to_pydict()
+            names = list(columns)
+            values = [column_values(column) for column in columns.values()]
+            self.write_rows((dict(zip(names, row)) for row in zip(*values)), row_class)
+            return
+
+        if diagnostics is not self.diagnostics:
+            self.diagnostics.merge(diagnostics)
+        self._ensure_header()
+        with self.diagnostics.activate():
+            for record in records:
+                self._write_record(record)
+                self.rows_read += 1
+        self._checkpoint_if_due()
+
+    def write_record(self, record: bytes):
+        """
+        Write an already encoded record, without the line separator.
+        """
+        if self._skip:
+            self._skip -= 1
+            return
+        self._ensure_header()
+        self._write_record(record)
+        self.rows_read += 1
+        self._checkpoint_if_due()
+
+    def write_records(self, records):
+        records = self._skip_completed(records)
+        self._ensure_header()
+        checkpoint = self.checkpoint_path is not None
+        # records may be encoded lazily, like the ones of write_columns
+        with self.diagnostics.activate():
+            for record in records:
+                self._write_record(record)
+                self.rows_read += 1
+                if checkpoint:
+                    self._checkpoint_if_due()
+
+    def flush(self):
+        self._flush_buffer()
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def checkpoint(self):
+        """
+        Flush and sync the output and record the current position in the
+        checkpoint file. Called automatically, see the checkpoint parameter.
+        """
+        if self.checkpoint_path is None:
+            raise ValueError("No checkpoint path given")
+        self.flush()
+        try:
+            os.fsync(self.stream.fileno())
+        except (AttributeError, OSError, ValueError):
+            # not a file, io.UnsupportedOperation is an OSError and ValueError
+            pass
+        write_checkpoint(
+            self.checkpoint_path,
+            {
+                "rows_read": self.rows_read,
+                "rows_written": self.rows_written,
+                "bytes": self.bytes_written,
+                "crc32": self._crc,
+                "errors": [
+                    [error.index, error.field_name, error.message]
+                    for error in self.errors
+                ],
+            },
+        )
+        self._next_checkpoint = self.rows_read + self.checkpoint_interval
+
+    def close(self):
+        """
+        Write the header if nothing else was written, flush the buffer and
+        return the writer stats. The stream itself is not closed.
+        """
+        if self._closed:
+            return self.stats
+
+        if not self._header_written and self.header is not None:
+            self.write_header()
+        if self.checkpoint_path is not None:
+            # a finished export is resumed without writing anything
+            self.checkpoint()
+        self.flush()
+        self._closed = True
+
+        logger.info(
+            "Wrote %d datanorm rows, %d bytes", self.rows_written, self.bytes_written
+        )
+        self.diagnostics.log_summary()
+        return self.stats
+
+    def _encode(self, row, row_class, encode=None):
+        """
+        Encode a row, returning None for invalid rows that are collected.
+        """
+        index = self.rows_read
+        self.rows_read += 1
+        try:
+            if encode is not None:
+                return encode(row)
+            return encode_row(row, row_class, self.validation)
+        except ValueError as e:
+            if not isinstance(row, Mapping):
+                row_class = getattr(row, "row_class", None) or type(row)
+            if not collects_errors(self.validation, row_class):
+                raise
+            self.errors.append(RowError.from_error(index, None, e))
+            return None
+
+    def _resume(self):
+        state = read_checkpoint(self.checkpoint_path)
+        offset = state["bytes"] if state else 0
+        if state:
+            self.stream.seek(0)
+            crc = 0
+            remaining = offset
+            while remaining:
+                data = self.stream.read(min(remaining, self.buffer_size))
+                if not data:
+                    break
+                crc = zlib.crc32(data, crc)
+                remaining -= len(data)
+            if remaining or crc != state["crc32"]:
+                raise ValueError(
+                    "Output does not match checkpoint %s" % self.checkpoint_path
+                )
+
+            self._crc = crc
+            self._skip = self.rows_read = state["rows_read"]
+            self.rows_written = state["rows_written"]
+            self.bytes_written = offset
+            self.errors = [RowError(*error) for error in state["errors"]]
+            self._header_written = offset > 0
+            self._next_checkpoint = self.rows_read + self.checkpoint_interval
+        # drop the records written after the checkpoint
+        self.stream.seek(offset)
+        self.stream.truncate()
+
+    def _skip_completed(self, rows):
+        """
+        Skip the input rows completed before resuming.
+        """
+        if not self._skip:
+            return rows
+        rows = iter(rows)
+        self._skip -= sum(1 for _ in itertools.islice(rows, self._skip))
+        return rows
+
+    def _skip_columns(self, columns):
+        """
+        Drop the rows completed before resuming from the front of columns.
+        """
+        if hasattr(columns, "to_pydict"):
+            columns = columns.to_pydict()
+        columns = dict(
+            (name, column_values(values)) for name, values in columns.items()
+        )
+        size = min(map(len, columns.values()), default=0)
+        skip = min(self._skip, size)
+        self._skip -= skip
+        return dict((name, values[skip:]) for name, values in columns.items())
+
+    def _checkpoint_if_due(self):
+        if self.checkpoint_path is not None and self.rows_read >= self._next_checkpoint:
+            self.checkpoint()
+
+    def _ensure_header(self):
+        if self._closed:
+            raise ValueError("Writer is closed")
+        if not self._header_written:
+            self.write_header()
+
+    def _flush_buffer(self):
+        if self._position:
+            self._write_stream(memoryview(self._buffer)[: self._position])
+            self._position = 0
+
+    def _write_stream(self, data):
+        self.stream.write(data)
+        if self._crc is not None:
+            self._crc = zlib.crc32(data, self._crc)
+
+    def _write_record(self, record: bytes):
+        self._write(record)
+        self._write(self.line_separator)
+        self.rows_written += 1
+
+    def _write_header_record(self, record: bytes):
+        # headers are not counted in rows_written
+        self._write(record)
+        self._write(self.line_separator)
+
+    def _write_block(self, data: bytes, count):
+        """
+        Write count records already joined with their line separators.
+        """
+        self._write(data)
+        self.rows_written += count
+
+    def _write(self, data: bytes):
+        size = len(data)
+        end = self._position + size
+        if end > self.buffer_size:
+            self._flush_buffer()
+            if size >= self.buffer_size:
+                self._write_stream(data)
+                self.bytes_written += size
+                return
+            end = size
+        self._buffer[self._position : end] = data
+        self._position = end
+        self.bytes_written += size
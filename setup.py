@@ -8,5 +8,7 @@ setup(
     author_email="raphael@ampad.de",
     description="A library for writing datanorm files",
     include_package_data=True,
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
+    python_requires=">=3.7",
+    entry_points={"console_scripts": ["datanorm-writer=datanorm_writer.cli:main"]},
 )
@@ -1,19 +1,51 @@
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import pickle
+import random
+import signal
+import subprocess
+import sys
+import tempfile
 import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from decimal import Decimal
 from unittest import TestCase
 
+from datanorm_writer import cli
+from datanorm_writer.aio import AsyncDatanormWriter
 from datanorm_writer.base import (
     DateField,
     IntegerField,
     RowBase,
+    RowError,
     ShortDateField,
     StaticField,
     StringField,
     charset_translations,
     chunk_text,
+    chunk_texts,
 )
-from datanorm_writer.rows import Artikelzeile, Artikelzeile2, VorlaufZeile
+from datanorm_writer.codec import CharsetCodec, get_codec
+from datanorm_writer.composer import LangtextIndex, ProductComposer
+from datanorm_writer.delta import DeltaExporter
+from datanorm_writer.diagnostics import Diagnostics
+from datanorm_writer.reader import DatanormReader
+from datanorm_writer.rows import (
+    Artikelzeile,
+    Artikelzeile2,
+    Langtextzeile,
+    Staffelpreiszeile,
+    VorlaufZeile,
+)
+from datanorm_writer.sorting import ExternalSorter
+from datanorm_writer.volumes import MultiVolumeWriter
+from datanorm_writer.writer import DatanormWriter
 
 
 class IntegerFieldTest(TestCase):
@@ -63,6 +95,35 @@ class StringFieldTest(TestCase):
         with self.assertRaises(ValueError):
             f.process("abcdef")
 
+    def test_values_validation(self):
+        f = StringField(values=(x for x in ["a", "b"]), max_length=1)
+        self.assertEqual(f.process("a"), "a")
+        self.assertEqual(f.process("b"), "b")
+        with self.assertRaises(ValueError):
+            f.process("c")
+        with self.assertRaises(ValueError):
+            f.process(["a"])
+
+    def test_values_column_validation(self):
+        f = StringField(values="ANL", length=1)
+        f.field_name = "verarbeitungsmerker"
+        self.assertEqual(f.process_column(["A", "N"]), ["A", "N"])
+        with self.assertRaises(RowError) as context:
+            f.process_column(["A", "AN", "X"])
+        self.assertEqual(context.exception.index, 1)
+
+    def test_row_constraints(self):
+        self.assertEqual(
+            Artikelzeile.constraints["verarbeitungsmerker"], frozenset("ANL")
+        )
+        self.assertEqual(len(Artikelzeile.constraints["textkennzeichen"]), 14)
+        self.assertEqual(Artikelzeile.constraints["preiskennzeichen"], {1, 2})
+        self.assertNotIn("artikelnummer", Artikelzeile.constraints)
+        with self.assertRaises(ValueError):
+            Artikelzeile.encode(
+                dict(DatanormWriterTest.article(1), textkennzeichen="99")
+            )
+
 
 class StaticFieldTest(TestCase):
     def test_static_field(self):
@@ -100,13 +161,26 @@ class ChunkTest(TestCase):
         for chunk in chunks:
             self.assertLessEqual(len(chunk), 5)
 
+    def test_text_chunk_whitespace(self):
+        self.assertEqual(
+            chunk_text("  ABC   DEF\tGHI  \n\n JK ", 5),
+            ["ABC ", "DEF\tG", "HI", "", "JK"],
+        )
+
+    def test_chunk_texts(self):
+        text = "ABC DEF " * 1000
+        chunks = chunk_texts([text, "x", text], 5)
+        self.assertEqual(chunks[0], tuple(chunk_text(text, 5)))
+        self.assertEqual(chunks[1], ("x",))
+        self.assertIs(chunks[0], chunks[2])
+
 
 class CharsetTest(TestCase):
     def test_output_charset_translation(self):
         output = Artikelzeile(
             kurztext_1="üÜöÖäÄß",
             textkennzeichen="00",
-            verarbeitungsmerker="0",
+            verarbeitungsmerker="N",
             preiskennzeichen=Artikelzeile.PREIS_LISTENPREIS,
             preiseinheit=Artikelzeile.PRICE_BY_1_UNIT,
         ).output
@@ -114,16 +188,74 @@ class CharsetTest(TestCase):
         self.assertIn(b"\x81\x9a\x94\x99\x84\x8e\xe1", output)
 
     def test_invalid_values_are_logged_and_removed(self):
-        with self.assertLogs(level="ERROR"):
+        with self.assertLogs(level="ERROR"), Diagnostics(log_records=True).activate():
             output = Artikelzeile(
-                kurztext_1="XXX°YYY",
+                kurztext_1="XXX✓YYY",
                 textkennzeichen="00",
-                verarbeitungsmerker="0",
+                verarbeitungsmerker="N",
                 preiskennzeichen=Artikelzeile.PREIS_LISTENPREIS,
                 preiseinheit=Artikelzeile.PRICE_BY_1_UNIT,
             ).output
             self.assertIn(b"XXXYYY", output)
 
+    def test_transliteration(self):
+        diagnostics = Diagnostics()
+        with diagnostics.activate():
+            output = Artikelzeile.encode(
+                dict(
+                    DatanormWriterTest.article(1),
+                    kurztext_1="Bogen 90° – Ø 20 „Café“ 5 €",
+                )
+            )
+        self.assertIn(b';Bogen 90 Grad - O 20 "Cafe" 5 EUR;', output)
+        self.assertFalse(diagnostics)
+
+    def test_transliteration_can_be_disabled(self):
+        class PlainArtikelzeile(Artikelzeile):
+            transliterations = None
+
+        with Diagnostics().activate():
+            output = PlainArtikelzeile.encode(
+                dict(DatanormWriterTest.article(1), kurztext_1="5 €")
+            )
+        self.assertIn(b";5 ;", output)
+
+    def test_length_is_checked_after_transliteration(self):
+        article = dict(DatanormWriterTest.article(1), kurztext_1="x" * 38 + "°")
+        with self.assertRaises(ValueError) as context:
+            Artikelzeile.encode(article)
+        self.assertEqual(context.exception.args[0], "kurztext_1")
+
+        columns = {"kurztext_1": ["a", "x" * 38 + "€"]}
+        for name in ("verarbeitungsmerker", "textkennzeichen"):
+            columns[name] = [article[name]] * 2
+        with self.assertRaises(RowError) as context:
+            list(Artikelzeile.encode_columns(columns))
+        self.assertEqual(context.exception.index, 1)
+        self.assertEqual(context.exception.field_name, "kurztext_1")
+
+    def test_rows_and_columns_check_the_encoded_length(self):
+        # NFKC turns ½ into 1⁄2, the fraction slash is missing from the charset
+        article = DatanormWriterTest.article(1)
+        for text, too_long in (("x" * 38 + "½", False), ("x" * 39 + "½", True)):
+            row = dict(article, kurztext_1=text)
+            columns = dict((name, [value]) for name, value in row.items())
+            with Diagnostics().activate():
+                if too_long:
+                    with self.assertRaises(ValueError):
+                        Artikelzeile.encode(row)
+                    with self.assertRaises(RowError):
+                        list(Artikelzeile.encode_columns(columns))
+                else:
+                    self.assertEqual(
+                        list(Artikelzeile.encode_columns(columns)),
+                        [Artikelzeile.encode(row)],
+                    )
+
+    def test_only_non_ascii_characters_are_transliterated(self):
+        with self.assertRaises(ValueError):
+            CharsetCodec(charset_translations, {";": ","})
+
 
 def example_export():
     lines = [
@@ -207,5 +339,1300 @@ class ExampleExportTest(TestCase):
         )
 
 
+class CacheTest(TestCase):
+    def test_cache_hits(self):
+        class TestRow(RowBase):
+            cache_size = 10
+            a = StringField(max_length=5)
+            b = IntegerField(max_length=3, cache_size=0)
+
+        for value in ["x", "y", "x", "x"]:
+            TestRow(a=value, b=1).output
+
+        info = TestRow.cache_info()
+        self.assertEqual(list(info), ["a"])
+        self.assertEqual((info["a"].hits, info["a"].misses), (2, 2))
+
+    def test_values_of_different_types_are_cached_separately(self):
+        class TestRow(RowBase):
+            a = StringField(max_length=5, cache_size=10)
+
+        self.assertEqual(TestRow(a=1).output, b"1;")
+        self.assertEqual(TestRow(a=1.0).output, b"1.0;")
+        self.assertEqual(TestRow(a=[1]).output, b"[1];")
+
+    def test_errors_are_not_cached(self):
+        class TestRow(RowBase):
+            a = StringField(max_length=2, cache_size=10)
+
+        diagnostics = Diagnostics()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                TestRow(a="abc").output
+            with diagnostics.activate():
+                self.assertEqual(TestRow(a="a✓").output, b"a;")
+        self.assertEqual(diagnostics.invalid_values, 2)
+
+    def test_fields_are_inherited(self):
+        class CachedArtikelzeile(Artikelzeile):
+            cache_size = 10
+
+        self.assertEqual(
+            list(CachedArtikelzeile.base_fields), list(Artikelzeile.base_fields)
+        )
+        row = {"verarbeitungsmerker": "N", "textkennzeichen": "00"}
+        row.update(preiskennzeichen=1, preiseinheit=0)
+        self.assertEqual(CachedArtikelzeile.encode(row), Artikelzeile.encode(row))
+
+
+class CompactRecordTest(TestCase):
+    values = {
+        "verarbeitungsmerker": "N",
+        "artikelnummer": "1",
+        "ean": "0123456789012",
+        "verpackungsmenge": 1,
+    }
+
+    def test_record_output(self):
+        record = Artikelzeile2.Record(**self.values)
+        self.assertEqual(record.output, Artikelzeile2(**self.values).output)
+        self.assertEqual(Artikelzeile2.encode_tuple(tuple(record)), record.output)
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_encode_tuple_validates(self):
+        with self.assertRaises(ValueError):
+            Artikelzeile2.encode_tuple(("B", "N"))
+        with self.assertRaises(ValueError):
+            Artikelzeile2.Record(satzartenkennzeichen="A").output
+
+    def test_row_subclasses_keep_attributes(self):
+        class SourcedArtikelzeile2(Artikelzeile2):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                self.source = "erp"
+
+        row = SourcedArtikelzeile2(**self.values)
+        self.assertEqual(row.source, "erp")
+        self.assertEqual(row.output, Artikelzeile2(**self.values).output)
+        self.assertEqual(row.fields, Artikelzeile2.base_fields)
+
+    def test_underscore_field_names(self):
+        class InternalArtikelzeile2(Artikelzeile2):
+            _intern = StringField(max_length=10)
+
+        values = dict(self.values, _intern="lager")
+        fields = InternalArtikelzeile2.base_fields
+        record = InternalArtikelzeile2.Record(*(values.get(name) for name in fields))
+        self.assertEqual(record.output, InternalArtikelzeile2(**values).output)
+        self.assertIn(b";lager;", record.output)
+        self.assertEqual(record._16, "lager")
+
+    def test_writer_accepts_records(self):
+        stream = io.BytesIO()
+        with DatanormWriter(stream, header=DatanormWriterTest.header) as writer:
+            writer.write_row(Artikelzeile2.Record(**self.values))
+        self.assertIn(Artikelzeile2(**self.values).output, stream.getvalue())
+
+
+class EncodeColumnsTest(TestCase):
+    columns = {
+        "verarbeitungsmerker": ["N", "A", "N"],
+        "artikelnummer": ["1", "2", "3"],
+        "textkennzeichen": ["00", "00", "10"],
+        "kurztext_1": ["eins", "zwei", "drei\nvier"],
+        "kurztext_2": ["Größe", "", "u\u0308"],
+        "preiskennzeichen": [1, 1, 2],
+        "preiseinheit": [0, 1, 0],
+        "preis": [1999, 0, 12345678],
+    }
+
+    def test_matches_row_output(self):
+        names = list(self.columns)
+        expected = [
+            Artikelzeile(**dict(zip(names, values))).output
+            for values in zip(*self.columns.values())
+        ]
+        self.assertEqual(list(Artikelzeile.encode_columns(self.columns)), expected)
+
+    def test_array_columns(self):
+        class Array(object):
+            def __init__(self, values):
+                self.values = values
+
+            def tolist(self):
+                return list(self.values)
+
+        columns = dict((name, Array(values)) for name, values in self.columns.items())
+        self.assertEqual(
+            list(Artikelzeile.encode_columns(columns)),
+            list(Artikelzeile.encode_columns(self.columns)),
+        )
+
+    def test_error_reports_row_index(self):
+        columns = dict(self.columns, preis=[1, 123456789, 3])
+        with self.assertRaises(RowError) as context:
+            list(Artikelzeile.encode_columns(columns))
+        self.assertEqual(context.exception.index, 1)
+        self.assertEqual(context.exception.field_name, "preis")
+
+        columns = dict(self.columns, kurztext_1=["a", "b", "x" * 41])
+        with self.assertRaises(RowError) as context:
+            list(Artikelzeile.encode_columns(columns))
+        self.assertEqual(context.exception.index, 2)
+
+    def test_static_columns_are_validated(self):
+        columns = dict(self.columns, satzartenkennzeichen=["A", None, "B"])
+        with self.assertRaises(RowError) as context:
+            list(Artikelzeile.encode_columns(columns))
+        self.assertEqual(context.exception.index, 2)
+
+    def test_processing_of_fields_is_kept(self):
+        class UpperField(StringField):
+            def process(self, value=None) -> str:
+                return super(UpperField, self).process(value).upper()
+
+        class Row(RowBase):
+            datum = DateField()
+            code = UpperField(max_length=5)
+
+        columns = {"datum": [date(2020, 1, 2)] * 2, "code": ["ab", "cd"]}
+        self.assertEqual(
+            list(Row.encode_columns(columns)), [b"20200102;AB;", b"20200102;CD;"]
+        )
+        # strings are no dates, neither for rows nor for columns
+        with self.assertRaises(AttributeError):
+            Row.encode({"datum": "20200102", "code": "ab"})
+        with self.assertRaises(AttributeError):
+            list(Row.encode_columns(dict(columns, datum=["20200102"] * 2)))
+
+    def test_invalid_columns(self):
+        with self.assertRaises(ValueError):
+            list(Artikelzeile.encode_columns(dict(self.columns, foo=[1, 2, 3])))
+        with self.assertRaises(ValueError):
+            list(Artikelzeile.encode_columns(dict(self.columns, preis=[1, 2])))
+
+
+class ProductComposerTest(TestCase):
+    product = {
+        "artikelnummer": "12345",
+        "kurztext_1": "one product",
+        "preiskennzeichen": Artikelzeile.PREIS_LISTENPREIS,
+        "preiseinheit": Artikelzeile.PRICE_BY_1_UNIT,
+        "mengeneinheit": "STK",
+        "preis": 1999,
+        "ean": "0123456789012",
+        "verpackungsmenge": 1,
+        "langtext": "first line of the long text\n"
+        + "a second line that is longer than forty characters",
+        "staffelpreise": [
+            {
+                "basismerker": "1",
+                "preiskennzeichen": "1",
+                "preis": 1999,
+                "von_basis": 1,
+            },
+            {
+                "basismerker": "1",
+                "preiskennzeichen": "1",
+                "preis": 1799,
+                "von_basis": 10,
+            },
+        ],
+    }
+
+    def test_compose(self):
+        records = list(ProductComposer().compose(self.product))
+        self.assertEqual(
+            records,
+            [
+                b"A;N;12345;41;one product;;1;0;STK;1999;;;1;",
+                b"B;N;12345;;;;0;0;0;0123456789012;;;0;1;;;",
+                b"T;N;1;;1;;first line of the long text;2;;a second line that is"
+                b" longer than forty;",
+                b"T;N;1;;3;;characters;;;;",
+                b"Z;N;12345;1;1;1;;1;1999;1;;",
+                b"Z;N;12345;2;1;1;;1;1799;10;;",
+            ],
+        )
+
+    def test_compose_all_numbers_long_texts(self):
+        product = dict(self.product, staffelpreise=None)
+        records = list(ProductComposer().compose_all([product, product]))
+        self.assertEqual(b"".join(record[:1] for record in records), b"ABTTABTT")
+        self.assertTrue(records[2].startswith(b"T;N;1;"))
+        self.assertTrue(records[6].startswith(b"T;N;2;"))
+        self.assertTrue(records[4].endswith(b";2;"))
+
+    def test_without_long_text(self):
+        product = dict(self.product, langtext="", kurztext_2="x", staffelpreise=())
+        records = list(ProductComposer("A").compose(product))
+        self.assertEqual(len(records), 2)
+        self.assertTrue(records[0].startswith(b"A;A;12345;00;"))
+
+    def test_langtext_batch(self):
+        composer = ProductComposer()
+        langtexts = [("1", self.product["langtext"]), ("2", "x " * 50), ("3", "y")]
+        expected = []
+        for langtextnummer, text in langtexts:
+            expected.extend(composer.langtext_records(langtextnummer, text))
+        self.assertEqual(list(composer.langtext_batch(langtexts)), expected)
+
+    def test_langtext_is_wrapped_after_transliteration(self):
+        text = "Preis 10 € pro Stück bei 20 ° Celsius und mehr Text hier ok ja " * 3
+        composer = ProductComposer()
+        records = list(composer.compose(dict(self.product, langtext=text)))
+        langtexts = [record for record in records if record[:1] == b"T"]
+        self.assertIn(b"10 EUR pro St\x81ck", langtexts[0])
+        self.assertEqual(list(composer.langtext_batch([("1", text)])), langtexts)
+
+    def test_staffelpreis_batch(self):
+        tiers = [
+            ("1", 1, Decimal("19.99")),
+            ("1", 10, Decimal("17.505")),
+            ("1", 100, 15),
+            ("2", 5, "4.20"),
+        ]
+        expected = [
+            b"Z;N;1;1;1;1;;1;1999;1;9;",
+            b"Z;N;1;2;1;1;;1;1751;10;99;",
+            b"Z;N;1;3;1;1;;1;1500;100;;",
+            b"Z;N;2;1;1;1;;1;420;5;;",
+        ]
+        composer = ProductComposer()
+        for batch_size in (1, 2, 1000):
+            records = composer.staffelpreis_batch(iter(tiers), batch_size=batch_size)
+            self.assertEqual(list(records), expected)
+
+        columns = dict(zip(("artikelnummer", "von_basis", "preis"), zip(*tiers)))
+        self.assertEqual(list(composer.staffelpreis_batch(columns)), expected)
+
+        cents = [("1", 1, 1999), ("1", 10, Decimal("1751")), ("1", 100, "1500")]
+        records = composer.staffelpreis_batch(cents, price_unit="cent")
+        self.assertEqual(list(records), expected[:3])
+
+    def test_staffelpreis_batch_errors(self):
+        composer = ProductComposer()
+        tiers = [("%d" % i, 1, Decimal("1.00")) for i in range(10)]
+        tiers[7] = ("7", 1, Decimal("1000000.00"))
+        with self.assertRaises(RowError) as context:
+            list(composer.staffelpreis_batch(tiers, batch_size=3))
+        self.assertEqual(
+            (context.exception.index, context.exception.field_name), (7, "preis")
+        )
+
+        with self.assertRaises(RowError) as context:
+            list(composer.staffelpreis_batch([("1", 10, 1), ("1", 5, 1)]))
+        self.assertEqual(context.exception.index, 1)
+
+        with self.assertRaises(RowError) as context:
+            tiers = [("1", 1, 100), ("1", 5, 99.5)]
+            list(composer.staffelpreis_batch(tiers, price_unit="cent"))
+        self.assertEqual(context.exception.index, 1)
+
+
+class LangtextIndexTest(TestCase):
+    def test_identical_texts_share_langtextnummer(self):
+        product = dict(ProductComposerTest.product, staffelpreise=None)
+        products = [
+            dict(product, artikelnummer="1"),
+            dict(product, artikelnummer="2", langtext=" " + product["langtext"]),
+            dict(product, artikelnummer="3", langtext="other text"),
+        ]
+
+        index = LangtextIndex()
+        composer = ProductComposer(langtext_index=index)
+        records = list(composer.compose_all(products))
+
+        self.assertEqual(b"".join(record[:1] for record in records), b"ABTTABABT")
+        self.assertTrue(records[0].endswith(b";1;"))
+        self.assertTrue(records[4].endswith(b";1;"))
+        self.assertTrue(records[6].endswith(b";2;"))
+        self.assertTrue(records[8].startswith(b"T;N;2;"))
+
+        self.assertEqual(
+            index.stats,
+            {
+                "texts": 2,
+                "duplicates": 1,
+                "bytes_saved": len(records[2]) + len(records[3]) + 4,
+            },
+        )
+
+
+class DeltaExporterTest(TestCase):
+    def product(self, number, price=100):
+        return {
+            "artikelnummer": str(number),
+            "kurztext_1": "product %d" % number,
+            "preiskennzeichen": Artikelzeile.PREIS_LISTENPREIS,
+            "preiseinheit": Artikelzeile.PRICE_BY_1_UNIT,
+            "preis": price,
+        }
+
+    def export(self, path, products, commit=True):
+        exporter = DeltaExporter(path)
+        records = list(exporter.export(products))
+        if commit:
+            exporter.commit()
+        return exporter, [record[: len(b"A;N;1")] for record in records]
+
+    def test_delta(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "fingerprints.db")
+        exporter, records = self.export(path, [self.product(i) for i in (1, 2, 3)])
+        self.assertEqual(
+            records, [b"A;N;1", b"B;N;1", b"A;N;2", b"B;N;2", b"A;N;3", b"B;N;3"]
+        )
+
+        products = [self.product(1), self.product(2, price=200), self.product(4)]
+        exporter, records = self.export(path, products, commit=False)
+        self.assertEqual(records, [b"A;A;2", b"B;A;2", b"A;N;4", b"B;N;4", b"A;L;3"])
+        self.assertEqual(
+            exporter.stats, {"new": 1, "changed": 1, "unchanged": 1, "deleted": 1}
+        )
+        exporter.rollback()
+
+        # without commit the previous state is kept
+        exporter, records = self.export(path, products)
+        self.assertEqual(exporter.stats["changed"], 1)
+
+        exporter, records = self.export(path, products)
+        self.assertEqual(records, [])
+        self.assertEqual(exporter.stats["unchanged"], 3)
+
+
+class CodecTest(TestCase):
+    def test_registered_codec(self):
+        self.assertEqual("Größe 5".encode("datanorm"), b"Gr\x94\xe1e 5")
+        self.assertEqual(b"Gr\x94\xe1e 5".decode("datanorm"), "Größe 5")
+        with self.assertRaises(UnicodeEncodeError):
+            "°".encode("datanorm")
+
+    def test_normalizes_decomposed_characters(self):
+        codec = get_codec(charset_translations)
+        self.assertEqual(codec.encode("u\u0308"), b"\x81")
+
+    def test_multi_byte_charset(self):
+        codec = get_codec({"a": b"bc", "d": b"d"})
+        self.assertEqual(codec.encode("ada"), b"bcdbc")
+
+    def test_codec_is_cached_per_charset(self):
+        charset = {"a": b"b"}
+        self.assertIs(get_codec(charset), get_codec(charset))
+        self.assertIsNot(get_codec(charset), get_codec(dict(charset)))
+
+
+class FixedWidthTest(TestCase):
+    class Record(RowBase):
+        kind = StaticField("X")
+        name = StringField(max_length=10)
+        number = IntegerField(length=4)
+        separator = b""
+        record_length = 15
+
+    def test_header_layout(self):
+        encoder = VorlaufZeile.encoder()
+        self.assertEqual(encoder.record_length, 128)
+        self.assertEqual(
+            [offset for field_name, offset, width in encoder.layout], [2, 8, 48, 88]
+        )
+        header = VorlaufZeile.encode(DatanormWriterTest.header)
+        self.assertEqual(header, b"V 020120" + b" " * 115 + b"04EUR")
+
+    def test_short_values_are_padded(self):
+        self.assertEqual(
+            self.Record.encode({"name": "abc", "number": 7}), b"Xabc       0007"
+        )
+        self.assertEqual(
+            VorlaufZeile.encode(
+                dict(DatanormWriterTest.header, informationstext1="Katalog"), "trusted"
+            )[8:48],
+            b"Katalog".ljust(40),
+        )
+
+    def test_parse(self):
+        record = self.Record.encode({"name": "abc", "number": 7})
+        row = self.Record.parse(record)
+        self.assertEqual(row.values, {"kind": "X", "name": "abc", "number": 7})
+        self.assertEqual(row.output, record)
+        with self.assertRaises(ValueError):
+            self.Record.parse(record + b" ")
+
+        header = VorlaufZeile.encode(DatanormWriterTest.header)
+        self.assertEqual(VorlaufZeile.parse(header).output, header)
+
+    def test_overlong_field_is_named(self):
+        values = dict(DatanormWriterTest.header, informationstext2="x" * 41)
+        with self.assertRaises(ValueError) as context:
+            VorlaufZeile.encode(values, "trusted")
+        self.assertEqual(context.exception.args[0], "informationstext2")
+
+    def test_record_length_is_checked(self):
+        class Short(RowBase):
+            name = StringField(max_length=10)
+            separator = b""
+            record_length = 11
+
+        with self.assertRaises(TypeError):
+            Short.encode({"name": "a"})
+
+    def test_batch_equals_single_records(self):
+        rows = [{"name": "n%d" % i, "number": i} for i in range(20)]
+        expected = b"".join(self.Record.encode(row) + b"\r\n" for row in rows)
+        self.assertEqual(self.Record.encode_many(rows), expected)
+
+        rows[13]["number"] = 10**5
+        with self.assertRaises(RowError) as context:
+            self.Record.encode_many(rows)
+        self.assertEqual(context.exception.index, 13)
+        self.assertEqual(context.exception.field_name, "number")
+
+    def test_writer_reuses_batch_buffer(self):
+        stream = io.BytesIO()
+        with DatanormWriter(stream, DatanormWriterTest.header, self.Record) as writer:
+            for start in (0, 5):
+                writer.write_batch(
+                    {"name": "n%d" % i, "number": i} for i in range(start, start + 5)
+                )
+            buffer = writer._batch_buffer
+            writer.write_batch([{"name": "last", "number": 10}] * 5)
+            self.assertIs(writer._batch_buffer, buffer)
+
+        records = stream.getvalue().split(b"\r\n")
+        self.assertEqual(len(records), 17)
+        self.assertEqual(records[6], b"Xn5        0005")
+        self.assertEqual(writer.rows_written, 15)
+
+
+class DatanormWriterTest(TestCase):
+    header = {
+        "erstellungsdatum": date(2020, 1, 2),
+        "informationstext1": " " * 40,
+        "informationstext2": " " * 40,
+        "informationstext3": " " * 35,
+    }
+
+    @staticmethod
+    def article(number):
+        return {
+            "verarbeitungsmerker": "N",
+            "artikelnummer": str(number),
+            "textkennzeichen": "00",
+            "kurztext_1": "product %d" % number,
+            "preiskennzeichen": Artikelzeile.PREIS_LISTENPREIS,
+            "preiseinheit": Artikelzeile.PRICE_BY_1_UNIT,
+            "preis": number,
+        }
+
+    def test_streams_rows_through_small_buffer(self):
+        rows = [self.article(i) for i in range(100)]
+        expected = (
+            b"\r\n".join(
+                [VorlaufZeile(**self.header).output]
+                + [Artikelzeile(**row).output for row in rows]
+            )
+            + b"\r\n"
+        )
+
+        stream = io.BytesIO()
+        writer = DatanormWriter(
+            stream, header=self.header, row_class=Artikelzeile, buffer_size=100
+        )
+        writer.write_rows(self.article(i) for i in range(100))
+        stats = writer.close()
+
+        self.assertEqual(stream.getvalue(), expected)
+        self.assertEqual(stats, {"rows": 100, "bytes": len(expected)})
+
+    def test_accepts_row_instances(self):
+        stream = io.BytesIO()
+        with DatanormWriter(stream, header=VorlaufZeile(**self.header)) as writer:
+            writer.write_row(Artikelzeile(**self.article(1)))
+
+        header, row, end = stream.getvalue().split(b"\r\n")
+        self.assertEqual(len(header), 128)
+        self.assertEqual(row, Artikelzeile(**self.article(1)).output)
+        self.assertEqual(end, b"")
+
+    def test_write_rows_parallel(self):
+        expected = io.BytesIO()
+        with DatanormWriter(expected, self.header, Artikelzeile) as writer:
+            writer.write_rows(self.article(i) for i in range(250))
+
+        stream = io.BytesIO()
+        with DatanormWriter(stream, self.header, Artikelzeile) as writer:
+            writer.write_rows_parallel(
+                (self.article(i) for i in range(250)), max_workers=2, chunk_size=40
+            )
+        self.assertEqual(stream.getvalue(), expected.getvalue())
+        self.assertEqual(writer.rows_written, 250)
+
+    def test_parallel_errors_report_row_index(self):
+        rows = [self.article(i) for i in range(100)]
+        rows[57]["preis"] = 10**9
+
+        writer = DatanormWriter(io.BytesIO(), self.header, Artikelzeile)
+        with ThreadPoolExecutor(2) as executor:
+            with self.assertRaises(RowError) as context:
+                writer.write_rows_parallel(rows, executor=executor, chunk_size=10)
+        self.assertEqual(context.exception.index, 57)
+        self.assertEqual(context.exception.field_name, "preis")
+
+    def test_mapping_needs_row_class(self):
+        writer = DatanormWriter(io.BytesIO(), header=self.header)
+        with self.assertRaises(ValueError):
+            writer.write_row(self.article(1))
+
+    def test_header_is_required(self):
+        writer = DatanormWriter(io.BytesIO(), row_class=Artikelzeile)
+        with self.assertRaises(ValueError):
+            writer.write_row(self.article(1))
+
+
+class DatanormReaderTest(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        self.addCleanup(os.remove, self.path)
+        with os.fdopen(handle, "wb") as f:
+            f.write(example_export())
+
+    def test_reads_typed_rows(self):
+        with DatanormReader(self.path) as reader:
+            rows = list(reader)
+
+        self.assertEqual(
+            [type(row) for row in rows],
+            [VorlaufZeile, Artikelzeile, Artikelzeile2, Artikelzeile, Artikelzeile2],
+        )
+        self.assertEqual(rows[0].values["erstellungsdatum"], date.today())
+        self.assertEqual(rows[1].values["preis"], 1999)
+        self.assertEqual(rows[2].values["ean"], "0123456789012")
+        self.assertEqual(
+            b"\r\n".join(row.output for row in rows) + b"\r\n", example_export()
+        )
+
+    def test_decodes_charset(self):
+        row = Artikelzeile(
+            verarbeitungsmerker="N",
+            textkennzeichen="00",
+            kurztext_1="Größe",
+            preiskennzeichen=1,
+            preiseinheit=0,
+        )
+        self.assertEqual(Artikelzeile.parse(row.output).values["kurztext_1"], "Größe")
+
+    def test_index_lookup(self):
+        with open(self.path, "rb") as f, DatanormReader(f) as reader:
+            self.assertEqual(reader.get("12346").values["kurztext_1"], "other product")
+            self.assertEqual(reader.get("12346", "B").values["ean"], "0123456789013")
+            self.assertIsNone(reader.get("99999"))
+            self.assertEqual(len(reader.index), 4)
+
+    def test_field_count_mismatch(self):
+        with self.assertRaises(ValueError):
+            Artikelzeile.parse(b"A;N;1;")
+
+
+class DiagnosticsTest(TestCase):
+    @staticmethod
+    def article(i):
+        return dict(
+            DatanormWriterTest.article(i),
+            kurztext_1="Rohr ✓ Nr. %d" % i if i % 2 else "Rohr",
+            kurztext_2="→" if i % 3 == 0 else "",
+        )
+
+    def test_writer_collects_summary(self):
+        diagnostics = Diagnostics(max_samples=3)
+        writer = DatanormWriter(
+            io.BytesIO(),
+            DatanormWriterTest.header,
+            Artikelzeile,
+            diagnostics=diagnostics,
+        )
+        writer.write_rows(self.article(i) for i in range(12))
+        with self.assertLogs("datanorm_writer.diagnostics", level="WARNING") as logs:
+            writer.close()
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(
+            diagnostics.summary(),
+            {
+                "invalid_values": 10,
+                "fields": {"kurztext_1": 6, "kurztext_2": 4},
+                "characters": {"✓": 6, "→": 4},
+                "samples": ["0", "1", "3"],
+            },
+        )
+
+    def test_parallel_workers_are_merged(self):
+        diagnostics = Diagnostics()
+        writer = DatanormWriter(
+            io.BytesIO(),
+            DatanormWriterTest.header,
+            Artikelzeile,
+            diagnostics=diagnostics,
+        )
+        with ThreadPoolExecutor(2) as executor:
+            writer.write_rows_parallel(
+                (self.article(i) for i in range(12)), executor=executor, chunk_size=5
+            )
+        self.assertEqual(diagnostics.invalid_values, 10)
+        self.assertEqual(diagnostics.samples, ["0", "1", "3", "5", "6", "7", "9", "11"])
+
+    def test_row_class_collector(self):
+        class CollectingArtikelzeile(Artikelzeile):
+            diagnostics = Diagnostics()
+
+        CollectingArtikelzeile.encode(self.article(1))
+        self.assertEqual(CollectingArtikelzeile.diagnostics.fields, {"kurztext_1": 1})
+        self.assertEqual(CollectingArtikelzeile.diagnostics.samples, ["1"])
+
+    def test_columns_report_row_samples(self):
+        class CollectingArtikelzeile(Artikelzeile):
+            diagnostics = Diagnostics()
+
+        articles = [self.article(i) for i in range(4)]
+        columns = dict((name, [a[name] for a in articles]) for name in articles[0])
+        records = list(CollectingArtikelzeile.encode_columns(columns))
+        self.assertEqual(records, [Artikelzeile.encode(a) for a in articles])
+        diagnostics = CollectingArtikelzeile.diagnostics
+        self.assertEqual(diagnostics.fields, {"kurztext_1": 2, "kurztext_2": 2})
+        self.assertEqual(sorted(diagnostics.samples), ["0", "1", "3"])
+
+    def test_writer_collects_columns(self):
+        articles = [self.article(i) for i in range(4)]
+        columns = dict((name, [a[name] for a in articles]) for name in articles[0])
+        for validation in ("strict", "collect"):
+            writer = DatanormWriter(
+                io.BytesIO(),
+                DatanormWriterTest.header,
+                Artikelzeile,
+                validation=validation,
+            )
+            writer.write_columns(columns)
+            self.assertEqual(
+                writer.diagnostics.fields, {"kurztext_1": 2, "kurztext_2": 2}
+            )
+            self.assertEqual(sorted(writer.diagnostics.samples), ["0", "1", "3"])
+
+        columns["kurztext_1"][2] = "x" * 50
+        writer = DatanormWriter(
+            io.BytesIO(), DatanormWriterTest.header, Artikelzeile, validation="collect"
+        )
+        writer.write_columns(columns)
+        self.assertEqual(len(writer.errors), 1)
+        self.assertEqual(writer.diagnostics.fields, {"kurztext_1": 2, "kurztext_2": 2})
+
+    def test_pickle(self):
+        diagnostics = Diagnostics()
+        diagnostics.add("kurztext_1", {"°"}, "1")
+        copy = pickle.loads(pickle.dumps(diagnostics))
+        copy.merge(diagnostics)
+        self.assertEqual(copy.characters, {"°": 2})
+
+
+class ValidationTest(TestCase):
+    @staticmethod
+    def articles(count, invalid=()):
+        for i in range(count):
+            article = DatanormWriterTest.article(i)
+            if i in invalid:
+                article["kurztext_1"] = "x" * 50
+            yield article
+
+    def test_trusted_matches_strict(self):
+        for article in self.articles(20):
+            self.assertEqual(
+                Artikelzeile.encode(article, "trusted"), Artikelzeile.encode(article)
+            )
+        record = Artikelzeile.Record(**DatanormWriterTest.article(1))
+        self.assertEqual(Artikelzeile.encode_tuple(record, "trusted"), record.output)
+
+    def test_trusted_skips_checks(self):
+        article = dict(DatanormWriterTest.article(1), kurztext_1="x" * 50)
+        with self.assertRaises(ValueError):
+            Artikelzeile.encode(article)
+        self.assertIn(b";" + b"x" * 50 + b";", Artikelzeile.encode(article, "trusted"))
+
+        class TrustedArtikelzeile(Artikelzeile):
+            validation = "trusted"
+
+        self.assertEqual(
+            TrustedArtikelzeile.encode(article), Artikelzeile.encode(article, "trusted")
+        )
+        self.assertIs(TrustedArtikelzeile.encoder(), TrustedArtikelzeile.encoder())
+        with self.assertRaises(ValueError):
+            Artikelzeile.encode(article, "lenient")
+
+    def test_trusted_columns(self):
+        columns = {"verarbeitungsmerker": ["N", "N"], "kurztext_1": ["a", "b\nc"]}
+        columns.update(textkennzeichen=["00"] * 2, preiskennzeichen=[1, 1])
+        columns.update(preiseinheit=[0, 0])
+        self.assertEqual(
+            list(Artikelzeile.encode_columns(columns, "trusted")),
+            list(Artikelzeile.encode_columns(columns)),
+        )
+
+    def export(self, write, **kwargs):
+        writer = DatanormWriter(
+            io.BytesIO(), DatanormWriterTest.header, Artikelzeile, **kwargs
+        )
+        write(writer)
+        writer.close()
+        return writer
+
+    def test_strict_raises(self):
+        with self.assertRaises(ValueError):
+            self.export(lambda writer: writer.write_rows(self.articles(10, {3})))
+
+    def test_collect_errors(self):
+        def write(writer):
+            writer.write_rows(self.articles(10, {3, 7}))
+            writer.write_row(Artikelzeile(**next(self.articles(1, {0}))))
+            with ThreadPoolExecutor(2) as executor:
+                writer.write_rows_parallel(
+                    self.articles(10, {0, 9}), executor=executor, chunk_size=3
+                )
+
+        writer = self.export(write, validation="collect")
+        self.assertEqual(
+            [(error.index, error.field_name) for error in writer.errors],
+            [(i, "kurztext_1") for i in (3, 7, 10, 11, 20)],
+        )
+        self.assertEqual(writer.rows_read, 21)
+        self.assertEqual(writer.rows_written, 16)
+
+    def test_collect_errors_from_columns(self):
+        class CollectingArtikelzeile(Artikelzeile):
+            validation = "collect"
+
+        columns = {"verarbeitungsmerker": ["N"] * 4, "preis": [1, 10**9, 2, 10**9]}
+        columns.update(textkennzeichen=["00"] * 4, preiskennzeichen=[1] * 4)
+        columns.update(preiseinheit=[0] * 4)
+        writer = DatanormWriter(
+            io.BytesIO(), DatanormWriterTest.header, CollectingArtikelzeile
+        )
+        writer.write_columns(columns)
+        writer.write_columns(columns)
+        self.assertEqual([error.index for error in writer.errors], [1, 3, 5, 7])
+        self.assertEqual(writer.rows_written, 4)
+
+    def test_strict_errors_count_earlier_rows(self):
+        articles = list(self.articles(6, {4}))
+        columns = dict((name, [a[name] for a in articles]) for name in articles[0])
+        for write, rows in (("write_batch", articles), ("write_columns", columns)):
+            writer = DatanormWriter(
+                io.BytesIO(), DatanormWriterTest.header, Artikelzeile
+            )
+            writer.write_rows(self.articles(10))
+            with self.assertRaises(RowError) as context:
+                getattr(writer, write)(rows)
+            self.assertEqual(context.exception.index, 14)
+
+
+class ExternalSorterTest(TestCase):
+    def records(self):
+        numbers = list(range(100, 400))
+        random.Random(0).shuffle(numbers)
+        for number in numbers:
+            artikelnummer = str(number)
+            article = DatanormWriterTest.article(number)
+            article["langtextnummer"] = artikelnummer
+            yield "A", artikelnummer, Artikelzeile.encode(article)
+            yield "B", artikelnummer, Artikelzeile2.encode(article)
+            for line in (1, 2):
+                yield "T", artikelnummer, Langtextzeile.encode(
+                    {
+                        "verarbeitungsmerker": "N",
+                        "langtextnummer": artikelnummer,
+                        "zeilennummer_1": line,
+                        "langtextzeile_1": "line %d" % line,
+                    }
+                )
+            yield "Z", artikelnummer, Staffelpreiszeile.encode(
+                {
+                    "verarbeitungsmerker": "N",
+                    "artikelnummer": artikelnummer,
+                    "satznummer": 1,
+                    "basismerker": "1",
+                    "preiskennzeichen": "1",
+                }
+            )
+
+    def test_sort(self):
+        records = list(self.records())
+        expected = [
+            record
+            for kind, artikelnummer, record in sorted(
+                records, key=lambda item: (item[1], "ABTZ".index(item[0]))
+            )
+        ]
+        # separate unsorted streams, with the price tiers first
+        records.sort(key=lambda item: item[0] != "Z")
+
+        with ExternalSorter(memory_limit=10000, max_runs=4) as sorter:
+            directory = sorter._directory
+            for kind, artikelnummer, record in records:
+                if kind == "T":
+                    sorter.add(artikelnummer, record)
+                else:
+                    sorter.add_record(record)
+            self.assertEqual(list(sorter), expected)
+            self.assertGreater(sorter.stats["runs"], 4)
+        self.assertFalse(os.path.exists(directory))
+
+    def test_in_memory(self):
+        sorter = ExternalSorter()
+        sorter.add("2", b"A;N;2;")
+        sorter.add("1", b"Z;N;1;")
+        sorter.add("1", b"A;N;1;")
+        self.assertEqual(list(sorter), [b"A;N;1;", b"Z;N;1;", b"A;N;2;"])
+        self.assertEqual(sorter.stats, {"records": 3, "runs": 0})
+        with self.assertRaises(ValueError):
+            sorter.add("3", b"A;N;3;")
+        sorter.close()
+
+
+class CliTest(TestCase):
+    mapping = {
+        "header": {"erstellungsdatum": "2020-01-01", "informationstext1": "Katalog"},
+        "columns": {"artikelnummer": "sku", "kurztext_1": "name", "preis": "price"},
+        "values": {
+            "verarbeitungsmerker": "N",
+            "textkennzeichen": "00",
+            "preiskennzeichen": 1,
+            "preiseinheit": 0,
+        },
+    }
+    products = [
+        {"sku": "1", "name": "Rohr", "price": "100", "ean": "4001"},
+        {"sku": "2", "name": "Muffe", "price": "x"},
+        {"sku": "3", "name": "Bogen", "price": "300"},
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        with open(os.path.join(self.path, "mapping.json"), "w") as f:
+            json.dump(self.mapping, f)
+        with open(os.path.join(self.path, "products.csv"), "w") as f:
+            f.write("sku,name,price,ean\n")
+            for product in self.products:
+                f.write(",".join(product.get(key, "") for key in product) + "\n")
+        with open(os.path.join(self.path, "products.jsonl"), "w") as f:
+            for product in self.products:
+                f.write(json.dumps(product) + "\n")
+
+    def run_cli(self, *argv):
+        output = os.path.join(self.path, "DATANORM.001")
+        argv = [
+            os.path.join(self.path, argv[0]),
+            "--mapping",
+            os.path.join(self.path, "mapping.json"),
+            "-o",
+            output,
+        ] + list(argv[1:])
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            status = cli.main(argv)
+        with open(output, "rb") as f:
+            return status, f.read(), stderr.getvalue()
+
+    def expected(self, products):
+        header = VorlaufZeile.encode(
+            {
+                "erstellungsdatum": date(2020, 1, 1),
+                "informationstext1": "Katalog".ljust(40),
+                "informationstext2": " " * 40,
+                "informationstext3": " " * 35,
+            }
+        )
+        records = [header]
+        for product in products:
+            values = dict(
+                self.mapping["values"],
+                artikelnummer=product["sku"],
+                kurztext_1=product["name"],
+                preis=int(product["price"]),
+                ean=product.get("ean"),
+            )
+            records.append(Artikelzeile.encode(values))
+            records.append(Artikelzeile2.encode(values))
+        return b"\r\n".join(records) + b"\r\n"
+
+    def test_csv(self):
+        status, output, stderr = self.run_cli("products.csv", "--validation", "collect")
+        self.assertEqual(status, 1)
+        self.assertEqual(output, self.expected([self.products[0], self.products[2]]))
+        self.assertIn("input row 2, field preis", stderr)
+
+    def test_strict(self):
+        with self.assertRaises(ValueError):
+            self.run_cli("products.csv")
+
+    def test_jsonl_parallel_with_stats(self):
+        self.products = [self.products[0], self.products[2]]
+        self.setUp()
+        status, output, stderr = self.run_cli(
+            "products.jsonl", "--jobs", "2", "--chunk-size", "1", "--stats"
+        )
+        self.assertEqual(status, 0)
+        self.assertEqual(output, self.expected(self.products))
+        self.assertIn("2 input rows, 0 skipped, 4 records", stderr)
+        self.assertIn("largest worker", stderr)
+
+    def test_records_are_counted(self):
+        converter = cli.Converter(
+            [Artikelzeile, Artikelzeile2],
+            self.mapping["columns"],
+            self.mapping["values"],
+            "collect",
+        )
+        stream = io.BytesIO()
+        writer = DatanormWriter(stream, DatanormWriterTest.header, validation="collect")
+        with writer:
+            writer.write_rows(self.products, encode=converter)
+        self.assertEqual(writer.stats["rows"], 4)
+        self.assertEqual(stream.getvalue().count(b"\r\n"), 5)
+
+    def test_resume(self):
+        checkpoint = os.path.join(self.path, "checkpoint.json")
+        options = ("--validation", "collect", "--checkpoint", checkpoint)
+        status, expected, stderr = self.run_cli("products.csv", *options)
+        # a finished export is kept, including its errors
+        status, output, stderr = self.run_cli("products.csv", *options, "--resume")
+        self.assertEqual(status, 1)
+        self.assertEqual(output, expected)
+        self.assertIn("input row 2, field preis", stderr)
+
+
+class ThreadSafetyTest(TestCase):
+    def test_concurrent_encoding(self):
+        class CachedArtikelzeile(Artikelzeile):
+            cache_size = 16
+
+        articles = [DatanormWriterTest.article(i % 50) for i in range(2000)]
+        expected = [Artikelzeile.encode(article) for article in articles]
+
+        def encode(start):
+            return [
+                CachedArtikelzeile.encode(article, validation)
+                for article, validation in zip(
+                    articles[start:] + articles[:start],
+                    itertools.cycle(["strict", "trusted", "collect"]),
+                )
+            ]
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(encode, range(0, 2000, 250)))
+        for start, result in zip(range(0, 2000, 250), results):
+            self.assertEqual(result, expected[start:] + expected[:start])
+
+    def test_thread_pool_export(self):
+        rows = [DatanormWriterTest.article(i) for i in range(100)]
+        expected = io.BytesIO()
+        with DatanormWriter(expected, DatanormWriterTest.header, Artikelzeile) as w:
+            w.write_rows(rows)
+
+        stream = io.BytesIO()
+        with DatanormWriter(stream, DatanormWriterTest.header, Artikelzeile) as w:
+            w.write_rows_parallel(rows, max_workers=4, chunk_size=7, threads=True)
+        self.assertEqual(stream.getvalue(), expected.getvalue())
+
+    def test_fields_have_no_value_state(self):
+        self.assertFalse(hasattr(Artikelzeile.base_fields["preis"], "value"))
+
+
+class MultiVolumeWriterTest(TestCase):
+    def export(self, **kwargs):
+        archive = io.BytesIO()
+        writer = MultiVolumeWriter(
+            archive, DatanormWriterTest.header, Artikelzeile, **kwargs
+        )
+        writer.write_rows(DatanormWriterTest.article(i) for i in range(100))
+        stats = writer.close()
+        self.assertEqual(stats["rows"], 100)
+
+        with zipfile.ZipFile(archive) as f:
+            volumes = [f.read(name) for name in f.namelist()]
+            self.assertEqual(
+                f.namelist(),
+                ["DATANORM.%03d" % (i + 1) for i in range(stats["volumes"])],
+            )
+        return volumes
+
+    def test_record_limit(self):
+        volumes = self.export(max_records=30, buffer_size=100)
+        self.assertEqual(len(volumes), 4)
+
+        header = VorlaufZeile(**DatanormWriterTest.header).output + b"\r\n"
+        rows = b"".join(
+            Artikelzeile(**DatanormWriterTest.article(i)).output + b"\r\n"
+            for i in range(100)
+        )
+        for volume in volumes:
+            self.assertTrue(volume.startswith(header))
+            self.assertEqual(volume.count(b"\r\n"), 31 if volume != volumes[-1] else 11)
+        self.assertEqual(b"".join(volume[len(header) :] for volume in volumes), rows)
+
+    def test_byte_limit(self):
+        volumes = self.export(max_bytes=1000)
+        self.assertGreater(len(volumes), 1)
+        for volume in volumes:
+            self.assertLessEqual(len(volume), 1000)
+            self.assertTrue(volume.endswith(b"\r\n"))
+
+    def test_archive_is_closed_on_error(self):
+        archive = io.BytesIO()
+        with self.assertRaises(RuntimeError):
+            with MultiVolumeWriter(
+                archive, DatanormWriterTest.header, Artikelzeile, max_records=30
+            ) as writer:
+                writer.write_rows(DatanormWriterTest.article(i) for i in range(50))
+                raise RuntimeError("interrupted")
+
+        self.assertFalse(writer.stream._thread.is_alive())
+        with zipfile.ZipFile(archive) as f:
+            self.assertEqual(f.namelist(), ["DATANORM.001", "DATANORM.002"])
+
+
+class CheckpointTest(TestCase):
+    # exports 1000 articles, killing itself while reading article 700
+    script = """
+import os, signal, sys
+from datanorm_writer.rows import Artikelzeile
+from datanorm_writer.writer import DatanormWriter
+from tests import DatanormWriterTest
+
+def articles():
+    for i in range(1000):
+        if i == 700:
+            os.kill(os.getpid(), signal.SIGKILL)
+        yield DatanormWriterTest.article(i)
+
+with open(sys.argv[1], "wb", buffering=0) as f:
+    writer = DatanormWriter(
+        f,
+        DatanormWriterTest.header,
+        Artikelzeile,
+        buffer_size=1000,
+        checkpoint=sys.argv[2],
+        checkpoint_interval=64,
+    )
+    writer.write_rows(articles())
+    writer.close()
+"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "DATANORM.001")
+        self.checkpoint = os.path.join(directory.name, "checkpoint.json")
+
+    @staticmethod
+    def export(rows, **kwargs):
+        stream = io.BytesIO()
+        writer = DatanormWriter(
+            stream, DatanormWriterTest.header, Artikelzeile, **kwargs
+        )
+        writer.write_rows(rows)
+        writer.close()
+        return stream.getvalue(), writer
+
+    @unittest.skipUnless(hasattr(signal, "SIGKILL"), "needs SIGKILL")
+    def test_resume_after_kill(self):
+        process = subprocess.run(
+            [sys.executable, "-c", self.script, self.output, self.checkpoint],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        self.assertEqual(process.returncode, -signal.SIGKILL)
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        self.assertEqual(state["rows_read"], 640)
+        # the buffer was written past the checkpoint, ending mid record
+        self.assertGreater(os.path.getsize(self.output), state["bytes"])
+
+        articles = [DatanormWriterTest.article(i) for i in range(1000)]
+        with open(self.output, "r+b") as f:
+            writer = DatanormWriter(
+                f,
+                DatanormWriterTest.header,
+                Artikelzeile,
+                checkpoint=self.checkpoint,
+                resume=True,
+            )
+            writer.write_rows(iter(articles))
+            stats = writer.close()
+
+        expected, _ = self.export(articles)
+        with open(self.output, "rb") as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(stats, {"rows": 1000, "bytes": len(expected)})
+
+    def test_resume_parallel_with_collected_errors(self):
+        articles = [DatanormWriterTest.article(i) for i in range(500)]
+        for i in (17, 250, 480):
+            articles[i]["preis"] = 10**9
+        expected, complete = self.export(articles, validation="collect")
+
+        def interrupted():
+            yield from articles[:300]
+            raise RuntimeError("evicted")
+
+        stream = io.BytesIO()
+        writer = DatanormWriter(
+            stream,
+            DatanormWriterTest.header,
+            Artikelzeile,
+            buffer_size=500,
+            validation="collect",
+            checkpoint=self.checkpoint,
+            checkpoint_interval=100,
+        )
+        with self.assertRaises(RuntimeError):
+            writer.write_rows(interrupted())
+
+        writer = DatanormWriter(
+            stream,
+            DatanormWriterTest.header,
+            Artikelzeile,
+            validation="collect",
+            checkpoint=self.checkpoint,
+            resume=True,
+        )
+        self.assertEqual([error.index for error in writer.errors], [17, 250])
+        writer.write_rows_parallel(articles, chunk_size=30, threads=True)
+        writer.close()
+        self.assertEqual(stream.getvalue(), expected)
+        self.assertEqual(
+            [error.args for error in writer.errors],
+            [error.args for error in complete.errors],
+        )
+
+        # a finished export is not written again
+        writer = DatanormWriter(
+            stream, checkpoint=self.checkpoint, resume=True, row_class=Artikelzeile
+        )
+        writer.write_rows(articles)
+        writer.close()
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_resume_columns_and_records(self):
+        articles = [DatanormWriterTest.article(i) for i in range(10)]
+        columns = dict(
+            (name, [article[name] for article in articles]) for name in articles[0]
+        )
+        records = [Artikelzeile2.encode(article) for article in articles]
+
+        def write(writer):
+            writer.write_columns(columns)
+            writer.write_records(iter(records))
+            writer.write_record(records[0])
+
+        expected = io.BytesIO()
+        with DatanormWriter(
+            expected, DatanormWriterTest.header, Artikelzeile
+        ) as writer:
+            write(writer)
+
+        for interval in (4, 15, 100):
+            stream = io.BytesIO()
+            writer = DatanormWriter(
+                stream,
+                DatanormWriterTest.header,
+                Artikelzeile,
+                checkpoint=self.checkpoint,
+                checkpoint_interval=interval,
+            )
+            writer.write_columns(columns)
+            writer.write_records(records[:7])
+            writer.flush()
+
+            writer = DatanormWriter(
+                stream,
+                DatanormWriterTest.header,
+                Artikelzeile,
+                checkpoint=self.checkpoint,
+                resume=True,
+            )
+            write(writer)
+            writer.close()
+            self.assertEqual(stream.getvalue(), expected.getvalue())
+            os.remove(self.checkpoint)
+
+    def test_resume_checks_output(self):
+        articles = [DatanormWriterTest.article(i) for i in range(10)]
+        data, _ = self.export(articles, checkpoint=self.checkpoint)
+        stream = io.BytesIO(data.replace(b"product 5", b"product 6"))
+        with self.assertRaises(ValueError):
+            DatanormWriter(stream, checkpoint=self.checkpoint, resume=True)
+
+
+class AsyncDatanormWriterTest(TestCase):
+    class Sink(object):
+        def __init__(self):
+            self.chunks = []
+
+        async def write(self, data):
+            await asyncio.sleep(0)
+            self.chunks.append(bytes(data))
+
+    async def rows(self, count, invalid=None):
+        for i in range(count):
+            await asyncio.sleep(0)
+            row = DatanormWriterTest.article(i)
+            if i == invalid:
+                row["preis"] = 10**9
+            yield row
+
+    def test_write_rows(self):
+        header = DatanormWriterTest.header
+        expected = io.BytesIO()
+        with DatanormWriter(expected, header, Artikelzeile) as writer:
+            writer.write_rows(DatanormWriterTest.article(i) for i in range(50))
+
+        async def export():
+            sink = self.Sink()
+            writer = AsyncDatanormWriter(
+                sink, header, Artikelzeile, batch_size=7, max_pending=2
+            )
+            async with writer:
+                await writer.write_rows(self.rows(50))
+            return sink, writer
+
+        sink, writer = asyncio.run(export())
+        self.assertEqual(b"".join(sink.chunks), expected.getvalue())
+        self.assertEqual(writer.stats, {"rows": 50, "bytes": len(expected.getvalue())})
+
+    def test_errors_report_row_index(self):
+        async def export():
+            writer = AsyncDatanormWriter(
+                self.Sink(), DatanormWriterTest.header, Artikelzeile, batch_size=5
+            )
+            await writer.write_rows(self.rows(30, invalid=23))
+
+        with self.assertRaises(RowError) as context:
+            asyncio.run(export())
+        self.assertEqual(context.exception.index, 23)
+
+
+class BenchmarkCatalogTest(TestCase):
+    def test_catalog_is_deterministic(self):
+        from benchmarks.catalog import CatalogGenerator
+        from benchmarks.scenarios import SCENARIOS
+
+        generator = CatalogGenerator(seed=3, umlaut_ratio=0.5, tiers=4)
+        products = list(generator.products(20))
+        self.assertEqual(products, list(generator.products(20)))
+        self.assertEqual(len(products[0]["staffelpreise"]), 4)
+
+        for row_class, scenario in SCENARIOS.values():
+            for values in scenario(products):
+                row_class.encode(values)
+
+
 if __name__ == "__main__":
     unittest.main()